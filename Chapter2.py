@@ -12,13 +12,15 @@ import ece163.Display.SliderWithValue
 stateNamesofInterest = ['pn', 'pe', 'pd', 'yaw', 'pitch', 'roll']
 
 positionRange = 10
+plotHistoryLength = 5000	# most recent states kept in each state plot
 
 class testInterface(baseInterface.baseInterface):
 	def __init__(self, parent=None):
 		self.vehicleState = vehicleState.vehicleState()
 		self.t = 0
 		super().__init__(parent)
-		self.stateGrid = ece163.Display.GridVariablePlotter.GridVariablePlotter(2, 3, [[x] for x in stateNamesofInterest], titles=stateNamesofInterest)
+		self.stateGrid = ece163.Display.GridVariablePlotter.GridVariablePlotter(2, 3, [[x] for x in stateNamesofInterest], titles=stateNamesofInterest,
+																				maxPoints=plotHistoryLength)
 
 		self.outPutTabs.addTab(self.stateGrid, "States")
 		self.outPutTabs.setCurrentIndex(2)
@@ -0,0 +1,299 @@
+"""
+Timing benchmarks for the hot paths of the 100 Hz simulation loop: the matrix helpers, rotations, the dynamics,
+aerodynamics, wind and sensor model updates, the state estimator (per filter and per step), the closed loop control
+update, trim and data recording/export. Each case is timed with timeit (median of several repeats) and reported as
+time per call. Results can be saved as a JSON baseline and later runs compared against it, flagging every case that is
+slower than the baseline by more than the regression threshold and by more than regressionFloor per call, so that the
+cases taking only a few microseconds do not flag timing noise.
+
+Cases whose setup or first call raises (for instance because a model has not been written yet) are reported as
+unavailable rather than failing the run.
+
+Run from the repository root with: python -m ece163.Benchmarks.HotPaths [--save baseline.json | --compare baseline.json]
+A baseline taken on a reference machine is kept next to this module in baseline.json, compare against it with
+--compare ece163/Benchmarks/baseline.json (timings from another machine are only a rough guide).
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+
+baselineFormatVersion = 2	# version 2 stores medians, version 1 stored the best repeat
+defaultThreshold = 0.5		# fractional slow down relative to the baseline that counts as a regression
+regressionFloor = 2e-6		# [s] slow downs per call smaller than this are never a regression
+defaultRepeat = 15			# timeit repeats, the median is kept
+targetCaseTime = 0.05		# [s] approximate time each repeat of a case should take, used to choose the number of calls
+
+def _matrixMultiply():
+	from ece163.Utilities import MatrixMath
+	A = [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 10.0]]
+	B = [[1.0], [2.0], [3.0]]
+	return lambda: MatrixMath.multiply(A, B)
+
+def _matrixTranspose():
+	from ece163.Utilities import MatrixMath
+	A = [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 10.0]]
+	return lambda: MatrixMath.transpose(A)
+
+def _matrixAdd():
+	from ece163.Utilities import MatrixMath
+	A = [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 10.0]]
+	return lambda: MatrixMath.add(A, A)
+
+def _euler2DCM():
+	from ece163.Utilities import Rotations
+	return lambda: Rotations.euler2DCM(0.3, -0.2, 0.1)
+
+def _dcm2Euler():
+	from ece163.Utilities import Rotations
+	dcm = Rotations.euler2DCM(0.3, -0.2, 0.1)
+	return lambda: Rotations.dcm2Euler(dcm)
+
+def _dynamicsUpdate():
+	from ece163.Modeling import VehicleDynamicsModel
+	from ece163.Containers import Inputs
+	model = VehicleDynamicsModel.VehicleDynamicsModel()
+	forces = Inputs.forcesMoments(Fx=1.0, Fy=0.5, Fz=-2.0, Mx=0.1, My=0.2, Mz=0.05)
+	return lambda: model.Update(forces)
+
+def _aerodynamicsUpdate():
+	from ece163.Modeling import VehicleAerodynamicsModel
+	from ece163.Containers import Inputs
+	model = VehicleAerodynamicsModel.VehicleAerodynamicsModel()
+	controls = Inputs.controlInputs()
+	return lambda: model.Update(controls)
+
+def _windUpdate():
+	from ece163.Modeling import WindModel
+	model = WindModel.WindModel()
+	return lambda: model.Update()
+
+def _sensorsUpdate():
+	from ece163.Modeling import VehicleAerodynamicsModel
+	from ece163.Sensors import SensorsModel
+	model = SensorsModel.SensorsModel(VehicleAerodynamicsModel.VehicleAerodynamicsModel())
+	return lambda: model.update()
+
+def _estimatorSensors():
+	from ece163.Containers import Sensors
+	sensors = Sensors.vehicleSensors()
+	sensors.gyro_x, sensors.gyro_y, sensors.gyro_z = 0.01, -0.02, 0.03
+	sensors.accel_x, sensors.accel_y, sensors.accel_z = 0.3, -0.2, -9.7
+	sensors.mag_x, sensors.mag_y, sensors.mag_z = 22750.0, 5286.8, 41426.3
+	sensors.gps_sog = 25.0
+	return sensors
+
+def _attitudeFilterUpdate():
+	from ece163.Estimation import VehicleEstimator
+	attitudeFilter = VehicleEstimator.ComplementaryAttitudeFilter()
+	sensors = _estimatorSensors()
+	return lambda: attitudeFilter.update(sensors, 0.01)
+
+def _positionFilterPredict():
+	from ece163.Estimation import VehicleEstimator
+	positionFilter = VehicleEstimator.PositionVelocityEKF()
+	return lambda: positionFilter.predict([0.1, -0.2, 0.05], 0.01)
+
+def _positionFilterGPS():
+	from ece163.Estimation import VehicleEstimator
+	positionFilter = VehicleEstimator.PositionVelocityEKF()
+	sensors = _estimatorSensors()
+	positionFilter.updateGPS(sensors)
+	def gpsStep():
+		positionFilter.updateGPS(sensors)
+		positionFilter.predict([0.0, 0.0, 0.0], 1.0)  # keeps the covariance from collapsing over many calls
+	return gpsStep
+
+def _estimatorUpdate():
+	from ece163.Estimation import VehicleEstimator
+	estimator = VehicleEstimator.VehicleEstimator()
+	sensors = _estimatorSensors()
+	return lambda: estimator.update(sensors)
+
+def _closedLoopUpdate():
+	from ece163.Controls import VehicleClosedLoopControl
+	from ece163.Containers import Controls
+	model = VehicleClosedLoopControl.VehicleClosedLoopControl()
+	reference = Controls.referenceCommands()
+	return lambda: model.Update(reference)
+
+def _computeTrim():
+	from ece163.Controls import VehicleTrim
+	trimInstance = VehicleTrim.VehicleTrim()
+	return lambda: trimInstance.computeTrim(25.0, 0.0, 0.0)
+
+def _recordData():
+	from ece163.Simulation import Simulate
+	from ece163.Containers import States
+	simulation = Simulate.Simulate()
+	state = States.vehicleState()
+	simulation.variableList.append((lambda: state, 'state', ['pn', 'pe', 'pd', 'yaw', 'pitch', 'roll', 'u', 'v', 'w',
+															  'p', 'q', 'r', 'Va', 'alpha', 'beta', 'chi']))
+	def recordStep():
+		simulation.recordData([0.0, 0.0, 0.0])
+		if len(simulation.takenData) > 10000:
+			simulation.takenData.clear()
+	return recordStep
+
+@contextlib.contextmanager
+def _exportCSV():
+	from ece163.Simulation import Simulate
+	simulation = Simulate.Simulate()
+	simulation.inputNames.extend(['a', 'b', 'c'])
+	simulation.takenData = [[index * 0.01, 1.0, 2.0, 3.0] for index in range(1000)]
+	with tempfile.TemporaryDirectory() as directory:
+		filename = os.path.join(directory, 'benchmark.csv')
+		yield lambda: simulation.exportToCSV(filename)
+
+def _perturbationTrimPoints(count=200):
+	from ece163.Containers import States
+	from ece163.Containers import Inputs
+	states = [States.vehicleState(u=20.0 + 20.0 * index / (count - 1), w=1.0) for index in range(count)]
+	inputs = [Inputs.controlInputs(0.6, 0.0, -0.1, 0.0) for state in states]
+	return states, inputs
+
+def _transferFunctionBatch():
+	from ece163.Controls import VehiclePerturbationModels
+	states, inputs = _perturbationTrimPoints()
+	return lambda: VehiclePerturbationModels.CreateTransferFunctionBatch(states, inputs)
+
+def _transferFunctionScalar():
+	from ece163.Controls import VehiclePerturbationModels
+	states, inputs = _perturbationTrimPoints()
+	createTransferFunction = VehiclePerturbationModels.CreateTransferFunction	# unavailable until written
+	return lambda: [createTransferFunction(state, trimInputs) for state, trimInputs in zip(states, inputs)]
+
+# name: (setup function returning the callable to time, or a context manager giving it for cases that need cleaning up
+# afterwards, number of calls per repeat or None to calibrate)
+benchmarkCases = {'MatrixMath.multiply': (_matrixMultiply, None),
+				  'MatrixMath.transpose': (_matrixTranspose, None),
+				  'MatrixMath.add': (_matrixAdd, None),
+				  'Rotations.euler2DCM': (_euler2DCM, None),
+				  'Rotations.dcm2Euler': (_dcm2Euler, None),
+				  'VehicleDynamicsModel.Update': (_dynamicsUpdate, None),
+				  'VehicleAerodynamicsModel.Update': (_aerodynamicsUpdate, None),
+				  'WindModel.Update': (_windUpdate, None),
+				  'SensorsModel.update': (_sensorsUpdate, None),
+				  'ComplementaryAttitudeFilter.update': (_attitudeFilterUpdate, None),
+				  'PositionVelocityEKF.predict': (_positionFilterPredict, None),
+				  'PositionVelocityEKF.updateGPS': (_positionFilterGPS, None),
+				  'VehicleEstimator.update': (_estimatorUpdate, None),
+				  'VehicleClosedLoopControl.Update': (_closedLoopUpdate, None),
+				  'VehicleTrim.computeTrim': (_computeTrim, 1),
+				  'VehiclePerturbationModels.CreateTransferFunctionBatch': (_transferFunctionBatch, 1),
+				  'VehiclePerturbationModels.CreateTransferFunction': (_transferFunctionScalar, 1),
+				  'Simulate.recordData': (_recordData, None),
+				  'Simulate.exportToCSV': (_exportCSV, 1)}
+
+def timeCase(setupFunction, number=None, repeat=defaultRepeat):
+	"""
+	Times one case, calibrating the number of calls per repeat so that each repeat takes about targetCaseTime.
+
+	:param setupFunction: function returning the zero argument callable to time (or a context manager giving it)
+	:param number: calls per repeat, calibrated if None
+	:param repeat: number of repeats, the median is used
+	:return: median time per call [s]
+	"""
+	setup = setupFunction()
+	if not isinstance(setup, contextlib.AbstractContextManager):
+		setup = contextlib.nullcontext(setup)
+	with setup as function:
+		function()  # first call outside of the timing, also surfaces errors from unfinished code
+		timer = timeit.Timer(function)
+		if number is None:
+			number, elapsed = timer.autorange()
+			number = max(1, int(number * targetCaseTime / max(elapsed, 1e-9)))
+		return statistics.median(timer.repeat(repeat=repeat, number=number)) / number
+
+def runBenchmarks(names=None, repeat=defaultRepeat):
+	"""
+	Runs the benchmark cases.
+
+	:param names: optional list of case names (or name prefixes) to run, all cases if None
+	:param repeat: number of timeit repeats per case
+	:return: dictionary of name to time per call [s], dictionary of name to error text for unavailable cases
+	"""
+	timings = dict()
+	unavailable = dict()
+	for name, (setupFunction, number) in benchmarkCases.items():
+		if names and not any(name.startswith(wanted) for wanted in names):
+			continue
+		try:
+			timings[name] = timeCase(setupFunction, number, repeat)
+		except Exception as error:
+			unavailable[name] = '{}: {}'.format(type(error).__name__, error)
+	return timings, unavailable
+
+def saveBaseline(timings, filename):
+	"""
+	Saves timings as a JSON baseline along with a description of the machine they were taken on.
+	"""
+	baseline = {'formatVersion': baselineFormatVersion, 'python': platform.python_version(),
+				'machine': platform.platform(), 'timings': timings}
+	with open(filename, 'w') as f:
+		json.dump(baseline, f, indent=1, sort_keys=True)
+	return
+
+def loadBaseline(filename):
+	"""
+	Loads the timings of a JSON baseline written by saveBaseline.
+	"""
+	with open(filename) as f:
+		baseline = json.load(f)
+	if baseline.get('formatVersion') != baselineFormatVersion:
+		raise ValueError('Unsupported benchmark baseline format in {}'.format(filename))
+	return baseline['timings']
+
+def compareToBaseline(timings, baselineTimings, threshold=defaultThreshold, floor=regressionFloor):
+	"""
+	Compares timings against a baseline. A case regresses when it is slower than the baseline by more than the threshold
+	fraction and also by more than floor seconds per call.
+
+	:param timings: dictionary of name to time per call [s]
+	:param baselineTimings: dictionary of name to baseline time per call [s]
+	:param threshold: fractional slow down that counts as a regression
+	:param floor: smallest slow down per call that counts as a regression [s]
+	:return: dictionary of name to ratio (new/baseline) for cases in both, list of names that regressed
+	"""
+	ratios = {name: timings[name] / baselineTimings[name] for name in timings if baselineTimings.get(name)}
+	regressions = [name for name, ratio in ratios.items()
+				   if ratio > 1.0 + threshold and timings[name] - baselineTimings[name] > floor]
+	return ratios, regressions
+
+def _formatTime(seconds):
+	for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+		if seconds >= scale:
+			return '{:8.3f} {}'.format(seconds / scale, unit)
+	return '{:8.1f} ns'.format(seconds / 1e-9)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Times the hot paths of the ece163 simulation loop')
+	parser.add_argument('cases', nargs='*', help='case names (or prefixes) to run, all if none given')
+	parser.add_argument('--save', metavar='FILE', help='save the timings as a baseline')
+	parser.add_argument('--compare', metavar='FILE', help='compare the timings to a saved baseline')
+	parser.add_argument('--threshold', type=float, default=defaultThreshold, help='allowed fractional slow down')
+	parser.add_argument('--floor', type=float, default=regressionFloor, help='allowed slow down per call [s]')
+	parser.add_argument('--repeat', type=int, default=defaultRepeat, help='timeit repeats per case')
+	arguments = parser.parse_args()
+
+	timings, unavailable = runBenchmarks(arguments.cases, arguments.repeat)
+	ratios, regressions = dict(), list()
+	nameWidth = max(len(name) for name in benchmarkCases)
+	if arguments.compare:
+		ratios, regressions = compareToBaseline(timings, loadBaseline(arguments.compare), arguments.threshold, arguments.floor)
+	for name, seconds in timings.items():
+		comparison = ''
+		if name in ratios:
+			comparison = ' {:6.2f}x baseline{}'.format(ratios[name], ' REGRESSION' if name in regressions else '')
+		print('{:{}s} {}{}'.format(name, nameWidth, _formatTime(seconds), comparison))
+	for name, error in unavailable.items():
+		print('{:{}s} unavailable ({})'.format(name, nameWidth, error))
+	if arguments.save:
+		saveBaseline(timings, arguments.save)
+	sys.exit(1 if regressions else 0)
@@ -0,0 +1,91 @@
+"""
+Import time benchmark for the headless parts of ece163. Each module is imported in a fresh interpreter started with
+python -X importtime, which reports the cumulative time spent importing it, and the interpreter then lists any of the
+heavy optional packages (GUI, plotting, optimization) that the import pulled in. Batch workers and worker processes
+import the modeling, control and simulation modules over and over, so these imports should stay cheap and must not drag
+in the GUI or scipy until a feature that needs them is used.
+
+Run from the repository root with: python -m ece163.Benchmarks.ImportTime
+"""
+
+import os
+import subprocess
+import sys
+
+# modules that must import without any of the forbiddenPackages
+headlessModules = ['ece163.Utilities.MatrixMath',
+				   'ece163.Utilities.Rotations',
+				   'ece163.Containers.States',
+				   'ece163.Containers.Serialization',
+				   'ece163.Modeling.VehicleDynamicsModel',
+				   'ece163.Modeling.VehicleAerodynamicsModel',
+				   'ece163.Modeling.WindModel',
+				   'ece163.Sensors.SensorsModel',
+				   'ece163.Estimation.VehicleEstimator',
+				   'ece163.Controls.VehicleTrim',
+				   'ece163.Controls.VehiclePerturbationModels',
+				   'ece163.Controls.VehicleControlGains',
+				   'ece163.Controls.VehicleClosedLoopControl',
+				   'ece163.Controls.VehicleGainSchedule',
+				   'ece163.Simulation.Chapter4Simulate',
+				   'ece163.Simulation.Chapter7Simulate']
+
+forbiddenPackages = ['PyQt5', 'pyqtgraph', 'scipy', 'matplotlib']
+
+importTimeLimit = 0.1	# [s] cumulative import time above which a module is reported as slow
+
+repositoryRoot = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_probeScript = '''
+import sys
+import {module}
+print(','.join(sorted({{name.split('.')[0] for name in sys.modules}} & set({forbidden!r}))))
+'''
+
+def measureImport(moduleName, forbidden=forbiddenPackages):
+	"""
+	Imports a module in a fresh interpreter and reports how long the import took and which forbidden packages it loaded.
+
+	:param moduleName: dotted module name
+	:param forbidden: list of top level package names that should not be imported
+	:return: (cumulative import time [s] or None if the import failed, list of forbidden packages loaded, error text)
+	"""
+	environment = dict(os.environ)
+	environment['PYTHONPATH'] = os.pathsep.join(filter(None, [repositoryRoot, environment.get('PYTHONPATH')]))
+	completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', _probeScript.format(module=moduleName, forbidden=forbidden)],
+							   cwd=repositoryRoot, env=environment, capture_output=True, text=True)
+	if completed.returncode != 0:
+		return None, list(), completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'import failed'
+	cumulative = None
+	for line in completed.stderr.splitlines():
+		# lines look like "import time:       123 |       4567 | ece163.Modeling.WindModel"
+		fields = line.split('|')
+		if len(fields) == 3 and fields[2].strip() == moduleName:
+			cumulative = int(fields[1].strip()) * 1e-6
+	loaded = [name for name in completed.stdout.strip().split(',') if name]
+	return cumulative, loaded, ''
+
+def runImportBenchmark(modules=headlessModules, forbidden=forbiddenPackages, timeLimit=importTimeLimit):
+	"""
+	Measures every module and decides whether it passes: no forbidden package loaded and under the time limit.
+
+	:return: list of dictionaries with module, seconds, forbidden, error and passed keys
+	"""
+	results = list()
+	for moduleName in modules:
+		seconds, loaded, error = measureImport(moduleName, forbidden)
+		passed = seconds is not None and not loaded and seconds <= timeLimit
+		results.append({'module': moduleName, 'seconds': seconds, 'forbidden': loaded, 'error': error, 'passed': passed})
+	return results
+
+if __name__ == "__main__":
+	results = runImportBenchmark()
+	for result in results:
+		if result['seconds'] is None:
+			timing = 'failed: {}'.format(result['error'])
+		else:
+			timing = '{:8.2f} ms'.format(result['seconds'] * 1e3)
+		extra = ' loads {}'.format(', '.join(result['forbidden'])) if result['forbidden'] else ''
+		status = 'ok' if result['passed'] else ('ERR' if result['seconds'] is None else 'FAIL')
+		print('{:4s} {:45s} {}{}'.format(status, result['module'], timing, extra))
+	sys.exit(0 if all(result['passed'] for result in results) else 1)
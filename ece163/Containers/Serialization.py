@@ -0,0 +1,161 @@
+"""
+File contains the versioned file format used to persist the container classes (vehicle states, control inputs, control
+gains, and control tuning parameters) to disk. The format is plain JSON holding a dictionary of named entries, so that many
+entries (e.g. several trims and gain sets) can live in one file. Each entry records its container type and the numeric
+value of each of its members; only the container types listed here can be re-created on load, so loading a file never
+executes arbitrary code (unlike pickle). This module does not depend on any of the GUI packages.
+"""
+
+import json
+import math
+import os
+
+from . import States
+from . import Inputs
+from . import Controls
+
+formatName = 'ece163'
+formatVersion = 1
+defaultFileName = 'VehicleParameters_Data.json'	# default file (in sys.path[0]) shared by the GUI widgets
+
+# container type name -> (constructor, list of members that are saved)
+containerTypes = {
+	'vehicleState': (States.vehicleState, ['pn', 'pe', 'pd', 'u', 'v', 'w', 'yaw', 'pitch', 'roll', 'p', 'q', 'r']),
+	'controlInputs': (Inputs.controlInputs, ['Throttle', 'Aileron', 'Elevator', 'Rudder']),
+	'controlGains': (Controls.controlGains, ['kp_roll', 'kd_roll', 'ki_roll', 'kp_sideslip', 'ki_sideslip', 'kp_course',
+											 'ki_course', 'kp_pitch', 'kd_pitch', 'kp_altitude', 'ki_altitude',
+											 'kp_SpeedfromThrottle', 'ki_SpeedfromThrottle', 'kp_SpeedfromElevator',
+											 'ki_SpeedfromElevator']),
+	'controlTuning': (Controls.controlTuning, ['Wn_roll', 'Zeta_roll', 'Wn_course', 'Zeta_course', 'Wn_sideslip',
+											   'Zeta_sideslip', 'Wn_pitch', 'Zeta_pitch', 'Wn_altitude', 'Zeta_altitude',
+											   'Wn_SpeedfromThrottle', 'Zeta_SpeedfromThrottle', 'Wn_SpeedfromElevator',
+											   'Zeta_SpeedfromElevator']),
+}
+
+def encodeEntry(container):
+	"""
+	Converts a container instance into a dictionary of plain numbers suitable for saving. Raises TypeError if the container
+	is not one of the supported types.
+
+	:param container: instance of vehicleState, controlInputs, controlGains or controlTuning
+	:return: dictionary with the type name and the member values
+	"""
+	typeName = type(container).__name__
+	if typeName not in containerTypes:
+		raise TypeError('Cannot serialize container of type {}'.format(typeName))
+	constructor, members = containerTypes[typeName]
+	return {'type': typeName, 'values': {member: float(getattr(container, member)) for member in members}}
+
+def decodeEntry(entry):
+	"""
+	Re-creates a container instance from a dictionary produced by encodeEntry. Raises ValueError if the entry is malformed
+	or of an unknown type. Members missing from the entry keep the container defaults.
+
+	:param entry: dictionary with 'type' and 'values' keys
+	:return: new container instance
+	"""
+	try:
+		typeName = entry['type']
+		values = entry['values']
+		constructor, members = containerTypes[typeName]
+	except (KeyError, TypeError):
+		raise ValueError('Malformed or unknown entry in parameter file')
+	kwargs = dict()
+	for member in members:
+		if member in values:
+			try:
+				value = float(values[member])
+			except (TypeError, ValueError):
+				raise ValueError('Non-numeric value for {}.{}'.format(typeName, member))
+			if not math.isfinite(value):
+				raise ValueError('Non-finite value for {}.{}'.format(typeName, member))
+			kwargs[member] = value
+	if typeName == 'vehicleState':
+		return constructor(**kwargs)  # constructor rebuilds the DCM and derived quantities from the Euler angles
+	container = constructor()
+	for member, value in kwargs.items():
+		setattr(container, member, value)
+	return container
+
+def saveEntries(filename, entries):
+	"""
+	Writes a dictionary of named containers to a file, replacing its contents. The file is written to a temporary name
+	first and then moved into place so that a crash never leaves a half written file.
+
+	:param filename: valid file path to write to
+	:param entries: dictionary of name -> container instance
+	:return: none
+	"""
+	fileContents = {'format': formatName, 'version': formatVersion,
+					'entries': {name: encodeEntry(container) for name, container in entries.items()}}
+	tempName = filename + '.tmp'
+	with open(tempName, 'w') as f:
+		json.dump(fileContents, f, indent=1)
+	os.replace(tempName, filename)
+	return
+
+def loadEntries(filename):
+	"""
+	Reads all of the named containers from a file. Raises FileNotFoundError if the file does not exist and ValueError if
+	the file is not a parameter file or was written by a newer version of the format.
+
+	:param filename: valid file path to read from
+	:return: dictionary of name -> container instance
+	"""
+	with open(filename, 'r') as f:
+		try:
+			fileContents = json.load(f)
+		except json.JSONDecodeError as e:
+			raise ValueError('Parameter file is not valid: {}'.format(e))
+	if not isinstance(fileContents, dict) or fileContents.get('format') != formatName:
+		raise ValueError('File is not an {} parameter file'.format(formatName))
+	version = fileContents.get('version')
+	if not isinstance(version, int) or version > formatVersion:
+		raise ValueError('Unsupported parameter file version {}'.format(version))
+	entries = fileContents.get('entries', dict())
+	if not isinstance(entries, dict):
+		raise ValueError('Malformed entries in parameter file')
+	return {name: decodeEntry(entry) for name, entry in entries.items()}
+
+def saveEntry(filename, name, container):
+	"""
+	Adds or replaces a single named container in a file, keeping all of the other entries. Creates the file if needed.
+
+	:param filename: valid file path
+	:param name: name of the entry
+	:param container: container instance to store
+	:return: none
+	"""
+	updateEntries(filename, {name: container})
+	return
+
+def updateEntries(filename, newEntries):
+	"""
+	Adds or replaces several named containers in a file, keeping all of the other entries. Creates the file if needed;
+	an unreadable existing file is replaced.
+
+	:param filename: valid file path
+	:param newEntries: dictionary of name -> container instance
+	:return: none
+	"""
+	try:
+		entries = loadEntries(filename)
+	except (FileNotFoundError, ValueError):
+		entries = dict()
+	entries.update(newEntries)
+	saveEntries(filename, entries)
+	return
+
+def loadEntry(filename, name, default=None):
+	"""
+	Reads a single named container from a file, returning default if the file or the entry is missing or unreadable.
+
+	:param filename: valid file path
+	:param name: name of the entry
+	:param default: value returned when the entry cannot be loaded
+	:return: container instance or default
+	"""
+	try:
+		return loadEntries(filename).get(name, default)
+	except (OSError, ValueError):
+		return default
@@ -0,0 +1,161 @@
+"""
+Gain scheduling for the successive loop closure autopilot. A single set of gains from VehicleControlGains.computeGains is
+only valid near the trim point used to build the transfer functions; this module precomputes controlGains over a regular
+grid of airspeed and altitude and interpolates between them as the vehicle flies. Because the grid is evenly spaced, the
+cell containing the current flight condition is found arithmetically, so each lookup costs the same regardless of the
+size of the table.
+"""
+
+import functools
+import math
+
+from ece163.Containers import Controls
+from ece163.Controls import VehicleControlGains
+
+gainNames = ['kp_roll', 'kd_roll', 'ki_roll', 'kp_sideslip', 'ki_sideslip', 'kp_course', 'ki_course', 'kp_pitch', 'kd_pitch',
+			 'kp_altitude', 'ki_altitude', 'kp_SpeedfromThrottle', 'ki_SpeedfromThrottle', 'kp_SpeedfromElevator',
+			 'ki_SpeedfromElevator']
+
+def _gridPoints(valueRange, count):
+	"""
+	Evenly spaced points from valueRange[0] to valueRange[1] inclusive, a single point if count is 1.
+	"""
+	if count < 1:
+		raise ValueError('Gain schedule needs at least one point per axis')
+	if count == 1:
+		return [float(valueRange[0])]
+	step = (valueRange[1] - valueRange[0]) / (count - 1)
+	return [valueRange[0] + step * index for index in range(count)]
+
+def trimTransferFunction(Vastar, altitude):
+	"""
+	Default linear model used to build the schedule: straight and level trim at Vastar, linearized into transfer
+	functions. The vehicle model uses a constant air density, so the altitude does not change the result and the trim
+	at each airspeed is only computed once.
+
+	:param Vastar: trim airspeed [m/s]
+	:param altitude: trim altitude [m] (unused)
+	:return: Linearized.transferFunctions
+	"""
+	return _airspeedTransferFunction(Vastar)
+
+@functools.lru_cache(maxsize=256)
+def _airspeedTransferFunction(Vastar):
+	"""
+	Straight and level trim transfer functions at Vastar, cached by airspeed (see trimTransferFunction).
+	"""
+	from ece163.Controls import VehicleTrim
+	from ece163.Controls import VehiclePerturbationModels
+	trimInstance = VehicleTrim.VehicleTrim()
+	if not trimInstance.computeTrim(Vastar):
+		raise ArithmeticError('No valid trim found for airspeed {} [m/s]'.format(Vastar))
+	return VehiclePerturbationModels.CreateTransferFunction(trimInstance.getTrimState(), trimInstance.getTrimControls())
+
+class VehicleGainSchedule():
+	def __init__(self, airspeedRange=(20.0, 40.0), airspeedCount=5, altitudeRange=(50.0, 250.0), altitudeCount=3):
+		"""
+		Creates an empty gain schedule over a regular airspeed/altitude grid. Use computeSchedule (or setGains for each
+		point) to fill it before looking up gains. Flight conditions outside of the grid use the gains at the edge.
+
+		:param airspeedRange: (minimum, maximum) airspeed of the grid [m/s]
+		:param airspeedCount: number of airspeed points in the grid
+		:param altitudeRange: (minimum, maximum) altitude of the grid [m]
+		:param altitudeCount: number of altitude points in the grid
+		"""
+		self.airspeeds = _gridPoints(airspeedRange, airspeedCount)
+		self.altitudes = _gridPoints(altitudeRange, altitudeCount)
+		self.airspeedStep = (self.airspeeds[-1] - self.airspeeds[0]) / (airspeedCount - 1) if airspeedCount > 1 else 1.0
+		self.altitudeStep = (self.altitudes[-1] - self.altitudes[0]) / (altitudeCount - 1) if altitudeCount > 1 else 1.0
+		# table of gains stored as plain lists for fast interpolation, [airspeed index][altitude index][gain index]
+		self.gainsTable = [[[0.0] * len(gainNames) for altitude in self.altitudes] for airspeed in self.airspeeds]
+		self.scheduledGains = Controls.controlGains()	# reused by scheduleGains for every lookup
+		return
+
+	def computeSchedule(self, tuningParameters, linearModelFunction=trimTransferFunction):
+		"""
+		Fills the whole schedule by building a linear model at each grid point and computing the gains from the tuning
+		parameters with VehicleControlGains.computeGains. The linear model function is called once per grid point; the
+		default one caches its trims by airspeed since it does not depend on altitude.
+
+		:param tuningParameters: controlTuning used at every grid point, or a function (Va, altitude) -> controlTuning
+		:param linearModelFunction: function (Va, altitude) -> Linearized.transferFunctions
+		:return: none
+		"""
+		for i, Va in enumerate(self.airspeeds):
+			for j, altitude in enumerate(self.altitudes):
+				if callable(tuningParameters):
+					tuning = tuningParameters(Va, altitude)
+				else:
+					tuning = tuningParameters
+				self.setGains(i, j, VehicleControlGains.computeGains(tuning, linearModelFunction(Va, altitude)))
+		return
+
+	def setGains(self, airspeedIndex, altitudeIndex, gains):
+		"""
+		Sets the gains at one grid point.
+
+		:param airspeedIndex: index into self.airspeeds
+		:param altitudeIndex: index into self.altitudes
+		:param gains: controlGains for that point
+		:return: none
+		"""
+		self.gainsTable[airspeedIndex][altitudeIndex] = [float(getattr(gains, name)) for name in gainNames]
+		return
+
+	def getGains(self, Va, altitude, gains=None):
+		"""
+		Looks up the gains for a flight condition with bilinear interpolation between the four surrounding grid points.
+
+		:param Va: current airspeed [m/s]
+		:param altitude: current altitude [m]
+		:param gains: controlGains to fill in place, a new one if None
+		:return: controlGains
+		"""
+		i, fracVa = self._cell(Va, self.airspeeds[0], self.airspeedStep, len(self.airspeeds))
+		j, fracAlt = self._cell(altitude, self.altitudes[0], self.altitudeStep, len(self.altitudes))
+		i1 = min(i + 1, len(self.airspeeds) - 1)
+		j1 = min(j + 1, len(self.altitudes) - 1)
+		g00 = self.gainsTable[i][j]
+		g01 = self.gainsTable[i][j1]
+		g10 = self.gainsTable[i1][j]
+		g11 = self.gainsTable[i1][j1]
+		w00 = (1.0 - fracVa) * (1.0 - fracAlt)
+		w01 = (1.0 - fracVa) * fracAlt
+		w10 = fracVa * (1.0 - fracAlt)
+		w11 = fracVa * fracAlt
+
+		if gains is None:
+			gains = Controls.controlGains()
+		for index, name in enumerate(gainNames):
+			setattr(gains, name, w00 * g00[index] + w01 * g01[index] + w10 * g10[index] + w11 * g11[index])
+		return gains
+
+	def scheduleGains(self, closedLoopControl, state=None):
+		"""
+		Updates the gains of a VehicleClosedLoopControl instance for its current airspeed and altitude. Meant to be called
+		once per step before the control update.
+
+		:param closedLoopControl: VehicleClosedLoopControl instance
+		:param state: vehicleState to schedule on (the estimate when flying on it), the true state of closedLoopControl
+			if None
+		:return: none
+		"""
+		if state is None:
+			state = closedLoopControl.getVehicleState()
+		closedLoopControl.setControlGains(self.getGains(state.Va, -state.pd, self.scheduledGains))
+		return
+
+	@staticmethod
+	def _cell(value, start, step, count):
+		"""
+		Index of the grid cell containing value and the fractional position inside it, clamped to the grid.
+		"""
+		if count == 1 or math.isnan(value):
+			return 0, 0.0
+		position = (value - start) / step
+		if position <= 0.0:
+			return 0, 0.0
+		if position >= count - 1:
+			return count - 1, 0.0
+		index = int(position)
+		return index, position - index
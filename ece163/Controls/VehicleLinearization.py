@@ -0,0 +1,159 @@
+"""
+Numerical linearization of the non-linear aircraft model into the state space models held in Linearized.stateSpace. Instead
+of deriving the Jacobians by hand (Beard Chapter 5), every state and input component is perturbed in both directions and the
+Jacobians are found with central differences. The derivative is taken from the same model the simulation flies, through
+the public interfaces of VehicleAerodynamicsModel (updateForces) and VehicleDynamicsModel (derivative), so the linear
+models always agree with the non-linear one. The perturbations of all the trim points of a trim map are laid out as one
+array, and the resulting Jacobians are reduced for the whole map at once.
+
+Lateral state is [v, p, r, roll, yaw] with inputs [Aileron, Rudder], longitudinal state is [u, w, q, pitch, height] with
+inputs [Elevator, Throttle], matching Linearized.stateSpace.
+"""
+
+import numpy
+
+from ece163.Containers import Inputs
+from ece163.Containers import Linearized
+from ece163.Containers import States
+from ece163.Modeling import VehicleAerodynamicsModel
+
+stateStep = 1e-4	# central difference perturbation of the states
+controlStep = 1e-4	# central difference perturbation of the control inputs
+
+stateNames = ['pn', 'pe', 'pd', 'u', 'v', 'w', 'yaw', 'pitch', 'roll', 'p', 'q', 'r']
+controlNames = ['Throttle', 'Aileron', 'Elevator', 'Rudder']
+
+lateralStates = ['v', 'p', 'r', 'roll', 'yaw']
+lateralControls = ['Aileron', 'Rudder']
+longitudinalStates = ['u', 'w', 'q', 'pitch', 'height']
+longitudinalControls = ['Elevator', 'Throttle']
+
+def _stateIndices(names):
+	"""
+	Maps state names to indices in stateNames, height uses the down position (with a sign flip applied later).
+	"""
+	return [stateNames.index('pd') if name == 'height' else stateNames.index(name) for name in names]
+
+def modelDerivative(aeroModel, x, u, wind=None):
+	"""
+	Derivative of the non-linear model at one state and control input, from the aerodynamics model's forces and moments
+	and the dynamics model's equations of motion.
+
+	:param aeroModel: VehicleAerodynamicsModel instance
+	:param x: array-like of the 12 states in stateNames order
+	:param u: array-like of the 4 controls in controlNames order
+	:param wind: windState, no wind if None
+	:return: list of the 12 state derivatives (Euler angle rates in place of the angles)
+	"""
+	state = States.vehicleState(*[float(value) for value in x])
+	controls = Inputs.controlInputs(*[float(value) for value in u])
+	forces = aeroModel.updateForces(state, States.windState() if wind is None else wind, controls)
+	dot = aeroModel.vehicleDynamics.derivative(state, forces)
+	return [getattr(dot, name) for name in stateNames]
+
+def computeJacobians(trimStates, trimControls, winds=None, aeroModel=None):
+	"""
+	Computes the full Jacobians A = df/dx and B = df/du about every trim point using central differences, 2*(12+4)
+	derivative evaluations per trim point.
+
+	:param trimStates: array [n x 12] of trim states (see stateNames for the order)
+	:param trimControls: array [n x 4] of trim controls (see controlNames for the order)
+	:param winds: optional sequence of n windState
+	:param aeroModel: VehicleAerodynamicsModel to linearize, a new one if None
+	:return: A [n x 12 x 12], B [n x 12 x 4]
+	"""
+	if aeroModel is None:
+		aeroModel = VehicleAerodynamicsModel.VehicleAerodynamicsModel()
+	x0 = numpy.atleast_2d(numpy.asarray(trimStates, dtype=float))
+	u0 = numpy.atleast_2d(numpy.asarray(trimControls, dtype=float))
+	nStates = x0.shape[-1]
+	nControls = u0.shape[-1]
+	nPerturb = nStates + nControls
+
+	# perturbation pattern: one row per perturbed component, + and - directions stacked
+	steps = numpy.concatenate((numpy.full(nStates, stateStep), numpy.full(nControls, controlStep)))
+	delta = numpy.diag(steps)
+	delta = numpy.concatenate((delta, -delta))  # [2*nPerturb x nPerturb]
+
+	z0 = numpy.concatenate((x0, u0), axis=-1)
+	z = z0[:, numpy.newaxis, :] + delta[numpy.newaxis, :, :]  # [n x 2*nPerturb x nPerturb]
+	f = numpy.empty(z.shape[:2] + (nStates,))
+	for point in range(z.shape[0]):
+		wind = None if winds is None else winds[point]
+		for row in range(z.shape[1]):
+			f[point, row] = modelDerivative(aeroModel, z[point, row, :nStates], z[point, row, nStates:], wind)
+
+	jacobian = (f[:, :nPerturb, :] - f[:, nPerturb:, :]) / (2.0 * steps[numpy.newaxis, :, numpy.newaxis])
+	jacobian = numpy.swapaxes(jacobian, 1, 2)  # [n x 12 x nPerturb], column j is d f / d z_j
+	return jacobian[:, :, :nStates], jacobian[:, :, nStates:]
+
+def _reduce(A, B, reducedStates, reducedControls):
+	"""
+	Extracts a reduced model from the full Jacobians, converting down position into height.
+	"""
+	rows = _stateIndices(reducedStates)
+	cols = [controlNames.index(name) for name in reducedControls]
+	Ar = A[:, rows][:, :, rows]
+	Br = B[:, rows][:, :, cols]
+	if 'height' in reducedStates:
+		h = reducedStates.index('height')
+		sign = numpy.ones(len(reducedStates))
+		sign[h] = -1.0
+		Ar = Ar * sign[numpy.newaxis, :, numpy.newaxis] * sign[numpy.newaxis, numpy.newaxis, :]
+		Br = Br * sign[numpy.newaxis, :, numpy.newaxis]
+	return Ar, Br
+
+def CreateStateSpaceArrays(trimStates, trimControls, winds=None, aeroModel=None):
+	"""
+	Linearizes the model about many trim points and returns the reduced lateral and longitudinal matrices as arrays.
+
+	:param trimStates: array [n x 12] of trim states
+	:param trimControls: array [n x 4] of trim controls
+	:param winds: optional sequence of n windState
+	:param aeroModel: VehicleAerodynamicsModel to linearize, a new one if None
+	:return: dictionary with A_longitudinal [n x 5 x 5], B_longitudinal [n x 5 x 2], A_lateral, B_lateral
+	"""
+	A, B = computeJacobians(trimStates, trimControls, winds, aeroModel)
+	models = dict()
+	models['A_longitudinal'], models['B_longitudinal'] = _reduce(A, B, longitudinalStates, longitudinalControls)
+	models['A_lateral'], models['B_lateral'] = _reduce(A, B, lateralStates, lateralControls)
+	return models
+
+def CreateStateSpaceMap(trimStates, trimInputs, aeroModel=None):
+	"""
+	Linearizes the model about every trim point in a trim map, returning one Linearized.stateSpace per point.
+
+	:param trimStates: sequence of vehicleState at trim
+	:param trimInputs: sequence of controlInputs at trim (same length as trimStates)
+	:param aeroModel: VehicleAerodynamicsModel to linearize, a new one if None
+	:return: list of Linearized.stateSpace
+	"""
+	if len(trimStates) != len(trimInputs):
+		raise ValueError('Trim states and trim inputs must have the same length')
+	x0 = [[getattr(state, name) for name in stateNames] for state in trimStates]
+	u0 = [[getattr(inputs, name) for name in controlNames] for inputs in trimInputs]
+	models = CreateStateSpaceArrays(x0, u0, aeroModel=aeroModel)
+	stateSpaceList = list()
+	for index, state in enumerate(trimStates):
+		newModel = Linearized.stateSpace()
+		newModel.Va_trim = state.Va
+		newModel.alpha_trim = state.alpha
+		newModel.beta_trim = state.beta
+		newModel.theta_trim = state.pitch
+		newModel.phi_trim = state.roll
+		newModel.gamma_trim = newModel.theta_trim - newModel.alpha_trim
+		for name, matrices in models.items():
+			setattr(newModel, name, matrices[index].tolist())
+		stateSpaceList.append(newModel)
+	return stateSpaceList
+
+def CreateStateSpace(trimState, trimInputs, aeroModel=None):
+	"""
+	Linearizes the model about a single trim point.
+
+	:param trimState: vehicleState at trim
+	:param trimInputs: controlInputs at trim
+	:param aeroModel: VehicleAerodynamicsModel to linearize, a new one if None
+	:return: Linearized.stateSpace
+	"""
+	return CreateStateSpaceMap([trimState], [trimInputs], aeroModel)[0]
@@ -5,3 +5,52 @@ from ece163.Containers import States
 from ece163.Containers import Inputs
 from ece163.Containers import Linearized
 from ece163.Utilities import MatrixMath
+
+transferFunctionNames = ['Va_trim', 'alpha_trim', 'beta_trim', 'gamma_trim', 'theta_trim', 'phi_trim',
+						 'a_phi1', 'a_phi2', 'a_beta1', 'a_beta2', 'a_theta1', 'a_theta2', 'a_theta3',
+						 'a_V1', 'a_V2', 'a_V3']	# members of Linearized.transferFunctions returned by the array path
+
+def CreateTransferFunctionBatch(trimStates, trimInputs):
+	"""
+	Bulk version of CreateTransferFunction: builds the transfer function models for a whole list of trim conditions.
+	Every model comes from CreateTransferFunction itself, so the batch always agrees with the scalar path.
+
+	:param trimStates: sequence of vehicleState at trim
+	:param trimInputs: sequence of controlInputs at trim (same length as trimStates)
+	:return: list of Linearized.transferFunctions
+	"""
+	if len(trimStates) != len(trimInputs):
+		raise ValueError('Trim states and trim inputs must have the same length')
+	return [CreateTransferFunction(trimState, trimInput) for trimState, trimInput in zip(trimStates, trimInputs)]
+
+def CreateTransferFunctionArrays(Va, alpha, beta, theta, phi, Throttle, Elevator):
+	"""
+	Array-in/array-out form of CreateTransferFunction for sensitivity studies. Every argument is an array of the same
+	shape (or broadcastable to it); a trim state with no wind is built for each element and handed to
+	CreateTransferFunctionBatch, and every returned coefficient has the broadcast shape.
+
+	:param Va: trim airspeed [m/s]
+	:param alpha: trim angle of attack [rad]
+	:param beta: trim sideslip angle [rad]
+	:param theta: trim pitch angle [rad]
+	:param phi: trim roll angle [rad]
+	:param Throttle: trim throttle [0-1]
+	:param Elevator: trim elevator [rad]
+	:return: dictionary of arrays keyed by the Linearized.transferFunctions member names
+	"""
+	import numpy  # the array paths import numpy on first use so the scalar model does not pay for it at import
+	arrays = numpy.broadcast_arrays(*[numpy.asarray(value, dtype=float)
+									  for value in (Va, alpha, beta, theta, phi, Throttle, Elevator)])
+	shape = arrays[0].shape
+	trimStates = list()
+	trimInputs = list()
+	for VaValue, alphaValue, betaValue, thetaValue, phiValue, ThrottleValue, ElevatorValue in zip(
+			*[array.ravel().tolist() for array in arrays]):
+		trimStates.append(States.vehicleState(u=VaValue * math.cos(alphaValue) * math.cos(betaValue),
+											  v=VaValue * math.sin(betaValue),
+											  w=VaValue * math.sin(alphaValue) * math.cos(betaValue),
+											  pitch=thetaValue, roll=phiValue))
+		trimInputs.append(Inputs.controlInputs(Throttle=ThrottleValue, Elevator=ElevatorValue))
+	transferFunctionList = CreateTransferFunctionBatch(trimStates, trimInputs)
+	return {name: numpy.array([getattr(model, name) for model in transferFunctionList], dtype=float).reshape(shape)
+			for name in transferFunctionNames}
@@ -18,8 +18,6 @@ from ece163.Containers import Inputs
 from ece163.Utilities import MatrixMath
 from ece163.Utilities import Rotations
 from ece163.Constants import VehiclePhysicalConstants as VPC
-import numpy
-from scipy.optimize import minimize
 
 
 class VehicleTrim():
@@ -82,6 +80,9 @@ class VehicleTrim():
 		:param gammastar: trim climb angle [rad]
 		:return: True or False (True if control inputs in range, False if not)
 		"""
+		# numpy and scipy are only imported once a trim is actually computed, so that importing this module stays cheap
+		import numpy
+		from scipy.optimize import minimize
 
 		self.VehicleTrimModel.vehicleDynamics.reset()
 		self.VehicleTrimModel.windModel.reset()
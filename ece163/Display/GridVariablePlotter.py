@@ -1,14 +1,20 @@
 """
 This is a convenience module designed to make grids of variables using the :mod:`.variablePlotter.variablePlotter`
 module. Please refer to that module for specifics of arguments.
+
+Data for the whole grid is passed to the gui thread with a single signal per call, and :func:`addNewAllDataBatch` accepts
+many samples for every plot at once; each plot then redraws at most once per display frame.
 """
 from . import variablePlotter
+import numpy
 import PyQt5.QtCore as QtCore
 import PyQt5.QtWidgets as QtWidgets
 
 
 class GridVariablePlotter(QtWidgets.QWidget):
-	def __init__(self, numRows, numCols, plotNames, titles=list(), xLabels=list(), yLabels=list(), useLegends=list(), parent=None):
+	newAllDataSignal = QtCore.pyqtSignal(list, object)
+	newAllDataBatchSignal = QtCore.pyqtSignal(list, object)
+	def __init__(self, numRows, numCols, plotNames, titles=list(), xLabels=list(), yLabels=list(), useLegends=list(), parent=None, maxPoints=None):
 		"""
 		Instantiates a new grid of variables suitable to be added to a gui.
 
@@ -20,6 +26,8 @@ class GridVariablePlotter(QtWidgets.QWidget):
 		:param xLabels: list of optional xLabels. Can insert None into list to skip.
 		:param yLabels: list of optional yLabels. Can insert None into list to skip.
 		:param useLegends: list of True/False indicating for each plot if legend is displayed
+		:param maxPoints: number of most recent points each plot keeps, passed to every variablePlotter. For a sliding
+			time window use the window length divided by the time between samples. None keeps every point.
 		"""
 		super().__init__(parent)
 
@@ -59,10 +67,14 @@ class GridVariablePlotter(QtWidgets.QWidget):
 				except TypeError:
 					curLegend = useLegends
 				# print(curLegend)
-				newVariablePlotter = variablePlotter.variablePlotter(curNames, curTitle, curXLabel, curYLabel, curLegend)
+				newVariablePlotter = variablePlotter.variablePlotter(curNames, curTitle, curXLabel, curYLabel, curLegend, maxPoints=maxPoints)
 				self.variablePlotters.append(newVariablePlotter)
 				self.usedLayout.addWidget(newVariablePlotter, row, col)
 
+		self.newAllDataSignal.connect(self._ProcessNewAllData)
+		self.newAllDataBatchSignal.connect(self._ProcessNewAllDataBatch)
+		return
+
 	def addNewAllData(self, newData, t=None):
 		"""
 		adds a new point of data to all elements in grid.
@@ -72,8 +84,35 @@ class GridVariablePlotter(QtWidgets.QWidget):
 		"""
 		if t is None:
 			t = [None]*self.plotCount
+		self.newAllDataSignal.emit(newData, t)
+		return
+
+	def addNewAllDataBatch(self, newData, t=None, perPlotTimes=False):
+		"""
+		adds many points of data to all elements in grid at once, with a single signal for the whole grid.
+
+		:param newData: list with one array like [lines x points] for each plot, see variablePlotter.addDataPoints
+		:param t: one array like [points] shared by all plots, or None to keep counting. With perPlotTimes, a list with
+			one array like [points] (or None) for each plot instead.
+		:param perPlotTimes: True if t holds separate x coordinates for each plot
+		"""
+		newData = [numpy.array(data, dtype=float, ndmin=2) for data in newData]
+		if not perPlotTimes:
+			t = [t]*len(newData)
+		elif len(t) != len(newData):
+			raise ValueError('perPlotTimes needs one entry of t for each plot, got {} for {} plots'.format(len(t), len(newData)))
+		t = [None if curT is None else numpy.array(curT, dtype=float, ndmin=1) for curT in t]
+		self.newAllDataBatchSignal.emit(newData, t)
+		return
+
+	def _ProcessNewAllData(self, newData, t):
+		for plot, data, curT in zip(self.variablePlotters, newData, t):
+			plot._ProcessNewPlotData(data, curT)
+		return
+
+	def _ProcessNewAllDataBatch(self, newData, t):
 		for plot, data, curT in zip(self.variablePlotters, newData, t):
-			plot.addDataPoint(data, curT)
+			plot._ProcessNewPlotDataBatch(data, curT)
 		return
 
 	def addNewSingleData(self, index, newData, t=None):
@@ -8,16 +8,18 @@ import ece163.Constants.VehiclePhysicalConstants as VehiclePhysicalConstants
 widgetName = "Wind Control"
 
 class WindControl(QtWidgets.QWidget):
-	def __init__(self, aeroInstance, parent=None):
+	def __init__(self, aeroInstance, parent=None, guiControls=None):
 		"""
 		generates a wind control widget using the lists in phsyical parameters. Needs a simulate instance so it can set them.
 
 		:param simulateInstance: simulate instance used for setting the wind values
+		:param guiControls: baseInterface the winds are applied through (between simulation steps), applied directly if None
 		"""
 
 		super().__init__(parent)
 
 		self.aeroInstance = aeroInstance
+		self.guiControls = guiControls
 
 		usedLayout = QtWidgets.QVBoxLayout()
 		self.setLayout(usedLayout)
@@ -70,5 +72,8 @@ class WindControl(QtWidgets.QWidget):
 		steadyWindsWanted = self.steadyWinds[self.steadyButtonsGroup.checkedId()]
 		gustWindsWanted = self.gustWinds[self.gustButtonsGroup.checkedId()]
 		# print(steadyWindsWanted, gustWindsWanted)
-		self.aeroInstance.setWindModel(*steadyWindsWanted, gustWindsWanted)
+		if self.guiControls is None:
+			self.aeroInstance.setWindModel(*steadyWindsWanted, gustWindsWanted)
+		else:
+			self.guiControls.applySimulationChange(self.aeroInstance.setWindModel, *steadyWindsWanted, gustWindsWanted)
 		return
@@ -2,13 +2,31 @@ import PyQt5.QtCore as QtCore
 import PyQt5.QtWidgets as QtWidgets
 import sys
 from . import vehicleDisplay
+from . import variablePlotter
 from ..Containers import States
+from ..Constants import VehiclePhysicalConstants as VPC
+import collections
+import copy
 import math
+import numpy
+import threading
+import time
 import traceback
 import os
 import datetime
 
-simulationThreadRate = 20
+displayFrameInterval = 33	# [ms] between display frames, the gui samples the latest simulation state at this rate
+workerSliceTime = 0.005		# [s] wall time the simulation worker sleeps between batches of steps
+maxSimulationLag = 0.1		# [s] wall time of steps the worker will catch up on after falling behind, older steps are dropped
+simulationSpeeds = [1/8, 1/4, 1/2, 1, 2, 4, 8, 20, 50, 100, 200, 500]	# multiples of real time offered in the gui
+throughputBatchSteps = 10	# steps taken between checks of the frame deadline in max throughput mode
+speedRatioWindow = 0.5		# [s] wall time over which the achieved simulation/wall time ratio is measured
+
+performanceSmoothing = 0.1	# weight of the newest frame in the running averages of the performance panel
+performanceNames = ['steps/s', 'frame ms', 'vehicle ms', 'plots ms']
+
+# real time locked steps on an absolute wall clock schedule at the selected speed, max throughput steps as fast as possible
+simulationModes = ['Real Time Locked', 'Max Throughput']
 
 class aboutTab(QtWidgets.QWidget):
 	def __init__(self, parent=None):
@@ -47,6 +65,7 @@ class exceptionTab(QtWidgets.QWidget):
 
 class baseInterface(QtWidgets.QMainWindow):
 	updateVehiclePositionSignal = QtCore.pyqtSignal(list)  # signal for redrawing the vehicle
+	simulationErrorSignal = QtCore.pyqtSignal(str)  # exceptions raised in the simulation worker, reported on the gui thread
 
 	def __init__(self, parent = None):
 		"""
@@ -56,17 +75,34 @@ class baseInterface(QtWidgets.QMainWindow):
 		runUpdate() overwritten to actually perform one step of the simulation
 		resetSimulationActions() actions taken on simulation reset
 		getvehicleState() overwritten to always return the valid state
+
+		While playing, runUpdate is called from a worker thread at the selected multiple of real time, and the state
+		update callbacks are called on the gui thread at the display frame rate with a copy of the latest state. Plots that
+		need every step list the vehicleState members in stepSampleNames and register with stepSamplesDefList, and gui
+		changes to the simulation go through applySimulationChange.
 		"""
 		super().__init__(parent)
 
 		# before we set up the gui we need a few data types to store
 		self.simulationPaused = True
 
-		self.curSpeedRate = 1
-		self.newSpeedRate = 1
-		self.threadTick = 0
-		self.curMultiTickRate = 1
-		self.newMultiTickRate = 1
+		self.speedMultiplier = 1.0
+		self.maxThroughputMode = False
+		self.scheduleSlips = 0  # number of times the real time schedule fell too far behind and was restarted
+		self.ratioReference = None  # (wall time, simulation time) the achieved speed ratio is measured from
+		self.simulationWorker = None
+		self.stopWorkerEvent = threading.Event()
+		self.workerStepCount = 0
+		# latest (state, simulation time) published by the worker, replaced by a single reference assignment so the gui
+		# never sees a partially written value and neither side has to take a lock
+		self.publishedFrame = None
+		self.displayedFrame = None
+		# changes to the simulation requested from the gui while the worker runs, applied by the worker between steps
+		self.pendingSimulationChanges = collections.deque()
+		# vehicleState members sampled after every step for stepSamplesDefList, the worker appends (time, values) and
+		# the gui drains them each display frame so plots get every step rather than one sample per frame
+		self.stepSampleNames = list()
+		self.stepSamples = collections.deque()
 
 		# we need a set of callbacks for when the state changes and the various gui elements need updating
 		self.stateUpdateDefList = list()
@@ -74,10 +110,14 @@ class baseInterface(QtWidgets.QMainWindow):
 		# after updates these are ones that take no arguments but same idea
 		self.afterUpdateDefList = list()
 
-		# we need to start the thread now, it just runs
-		self.simulationTimedThread = QtCore.QTimer()
-		self.simulationTimedThread.setInterval(simulationThreadRate)
-		self.simulationTimedThread.timeout.connect(self.runSimulation)
+		# callbacks given the samples of every step since the last frame, as (times [steps], values [names x steps])
+		self.stepSamplesDefList = list()
+
+		# the display timer samples whatever the simulation worker last published
+		self.displayTimer = QtCore.QTimer()
+		self.displayTimer.setInterval(displayFrameInterval)
+		self.displayTimer.timeout.connect(self.displayFrame)
+		self.simulationErrorSignal.connect(self.simulationErrorResponse)
 
 		self.mainWidget = QtWidgets.QWidget()
 		self.mainLayout = QtWidgets.QVBoxLayout()
@@ -132,6 +172,21 @@ class baseInterface(QtWidgets.QMainWindow):
 			self.numericStatesDict[name] = newLabel
 		self.stateUpdateDefList.append(self.updateNumericStateBox)
 
+		# performance panel, averages are updated every frame and shown every speedRatioWindow
+		self.performanceGrid = QtWidgets.QGridLayout()
+		self.numericStateBox.addLayout(self.performanceGrid)
+		self.performanceLabels = dict()
+		for i, name in enumerate(performanceNames):
+			newLabel = QtWidgets.QLabel("{}: -".format(name))
+			self.performanceGrid.addWidget(newLabel, 0, i)
+			self.performanceLabels[name] = newLabel
+		self.profileStepsBox = QtWidgets.QCheckBox("Profile Steps")
+		self.profileStepsBox.stateChanged.connect(self.profileStepsResponse)
+		self.performanceGrid.addWidget(self.profileStepsBox, 0, len(performanceNames))
+		self.stepCostLabel = QtWidgets.QLabel("")
+		self.performanceGrid.addWidget(self.stepCostLabel, 1, 0, 1, len(performanceNames)+1)
+		self.frameTimes = {'frame ms': 0.0, 'vehicle ms': 0.0, 'plots ms': 0.0}
+
 		# self.numericStateBox.addStretch()
 
 		self.simulationControlsBox = QtWidgets.QHBoxLayout()
@@ -156,19 +211,26 @@ class baseInterface(QtWidgets.QMainWindow):
 		self.simulationControlsBox.addLayout(self.simulationSpeedsBox)
 		self.simulationSpeedsGroup = QtWidgets.QButtonGroup()
 
-		for ratio in [20, 8, 4, 2, 1, 1/2, 1/4, 1/8]:
-			newRatio = 1/(simulationThreadRate/(simulationThreadRate/ratio))
-			newRadio = QtWidgets.QRadioButton("{}x".format(newRatio))
-			newRadio.threadRate = ratio
+		for ratio in simulationSpeeds:
+			newRadio = QtWidgets.QRadioButton("{:g}x".format(ratio))
+			newRadio.speedMultiplier = ratio
 			self.simulationSpeedsBox.addWidget(newRadio)
 			self.simulationSpeedsGroup.addButton(newRadio)
-		self.simulationSpeedsGroup.buttons()[-4].setChecked(True)
+		self.simulationSpeedsGroup.buttons()[simulationSpeeds.index(1)].setChecked(True)
 		self.simulationSpeedsGroup.buttonToggled.connect(self.speedChangedResponse)
 
+		self.simulationModeBox = QtWidgets.QComboBox()
+		self.simulationModeBox.addItems(simulationModes)
+		self.simulationModeBox.currentIndexChanged.connect(self.modeChangedResponse)
+		self.simulationControlsBox.addWidget(self.simulationModeBox)
+
 		self.currentTime = 0
 		self.simulationControlsBox.addWidget(QtWidgets.QLabel("Current Time: "))
 		self.currentTimeLabel = QtWidgets.QLabel(str(datetime.timedelta(seconds=self.currentTime)))
 		self.simulationControlsBox.addWidget(self.currentTimeLabel)
+		self.simulationControlsBox.addWidget(QtWidgets.QLabel("Sim/Wall: "))
+		self.speedRatioLabel = QtWidgets.QLabel("-")
+		self.simulationControlsBox.addWidget(self.speedRatioLabel)
 		self.simulationControlsBox.addStretch()
 
 		self.mainLayout.addStretch()
@@ -178,37 +240,287 @@ class baseInterface(QtWidgets.QMainWindow):
 
 	def runSimulation(self):
 		"""
-		internal method called in a thread to handle simulation updates
+		steps the simulation once on the gui thread and refreshes the display, used when the interface is driven directly
+		(e.g. from sliders) rather than by playing the simulation
 		"""
-		if self.threadTick % self.curSpeedRate == 0:
-			try:
-				for i in range(self.curMultiTickRate):
-					self.runUpdate()
-					self.runUpdate()  # Only updating the screen at half of the integration rate
-			except Exception as e:
-				self.raiseExceptionToUser(traceback.format_exc())
-				# traceback.print_exc()
-				self.PauseSimulation()
-			self.afterUpdateActions()
+		try:
+			self.stepSimulation()
+			self.stepSimulation()
+		except Exception:
+			self.raiseExceptionToUser(traceback.format_exc())
+			self.PauseSimulation()
+		self.deliverStepSamples()
+		self.afterUpdateActions()
+		self.updateTimeLabel(self.getSimulationTime())
+		return
+
+	def simulationStepTime(self):
+		"""
+		Simulated time advanced by one call to runUpdate [s].
+		"""
+		return VPC.dT
+
+	def getSimulationTime(self):
+		"""
+		Current simulated time [s], taken from simulateInstance if the interface has one.
+		"""
+		try:
+			return self.simulateInstance.time
+		except AttributeError:
+			return self.workerStepCount*self.simulationStepTime()
+
+	def applySimulationChange(self, function, *args):
+		"""
+		Applies a change to the simulation (e.g. new winds, gains or trim) requested from the gui. While the worker is
+		running the change is queued and applied by the worker between two steps, so the gui never changes the simulation
+		in the middle of a step; otherwise it is applied immediately. Gui callbacks that modify the simulation should go
+		through here.
+
+		:param function: function making the change
+		:param args: arguments passed to function
+		"""
+		if self.simulationWorker is None:
+			function(*args)
+		else:
+			self.pendingSimulationChanges.append((function, args))
+		return
+
+	def applyPendingSimulationChanges(self):
+		"""
+		Applies the queued gui changes in the order they were requested.
+		"""
+		while self.pendingSimulationChanges:
+			function, args = self.pendingSimulationChanges.popleft()
+			function(*args)
+		return
+
+	def stepSimulation(self):
+		"""
+		Takes one simulation step: applies the pending gui changes, calls runUpdate and samples stepSampleNames.
+		"""
+		self.applyPendingSimulationChanges()
+		self.runUpdate()
+		if self.stepSampleNames:
+			curState = self.getVehicleState()
+			self.stepSamples.append((self.getSimulationTime(), [getattr(curState, name) for name in self.stepSampleNames]))
+		return
+
+	def deliverStepSamples(self):
+		"""
+		Hands every step sample taken since the last call to the stepSamplesDefList callbacks as one batch.
+		"""
+		count = len(self.stepSamples)
+		if count == 0:
+			return
+		samples = [self.stepSamples.popleft() for i in range(count)]
+		times = numpy.array([sampleTime for sampleTime, values in samples])
+		values = numpy.array([values for sampleTime, values in samples]).T
+		for updater in self.stepSamplesDefList:
+			updater(times, values)
+		return
+
+	def publishFrame(self):
+		"""
+		Called by the simulation worker to hand the latest state to the gui. The copy is made here so that the gui only
+		ever sees complete states, the handoff itself is a single reference assignment.
+		"""
+		self.publishedFrame = (copy.deepcopy(self.getVehicleState()), self.getSimulationTime(), time.perf_counter())
+		return
+
+	def simulationWorkerLoop(self):
+		"""
+		Body of the simulation worker thread, runs the selected mode until stopped.
+		"""
+		try:
+			while not self.stopWorkerEvent.is_set():
+				if self.maxThroughputMode:
+					self.runMaxThroughput()
+				else:
+					self.runRealTimeLocked()
+		except Exception:
+			errorText = traceback.format_exc()
 			try:
-				self.currentTime = self.simulateInstance.time
-				self.currentTimeLabel.setText(str(datetime.timedelta(seconds=self.currentTime)))
-			except AttributeError:
-				pass
-			self.curSpeedRate = self.newSpeedRate
-			self.curMultiTickRate = self.newMultiTickRate
-		self.threadTick += 1
+				self.publishFrame()  # show the state the error happened in, if it can still be read
+			except Exception:
+				errorText += '\nThe state could not be published:\n' + traceback.format_exc()
+			self.simulationErrorSignal.emit(errorText)
+		return
+
+	def runRealTimeLocked(self):
+		"""
+		Steps the simulation on an absolute schedule: step n after the schedule start is due at wall time
+		start + n*stepTime/speedMultiplier. Because every deadline is computed from the start rather than from the previous
+		step, timing errors do not accumulate into drift. Returns when the mode or speed changes or the worker is stopped.
+		If the simulation falls more than maxSimulationLag behind (it cannot keep up at this speed), the schedule is
+		restarted from the current time and the missed steps are dropped. Steps that are behind are caught up in batches that
+		end at the next display frame, so the state is still published every frame while catching up.
+		"""
+		stepTime = self.simulationStepTime()
+		frameTime = displayFrameInterval/1000
+		speed = self.speedMultiplier
+		startWall = time.perf_counter()
+		startStep = self.workerStepCount
+		maxStepsBehind = max(1, int(maxSimulationLag*speed/stepTime))
+		while not self.stopWorkerEvent.is_set() and not self.maxThroughputMode and self.speedMultiplier == speed:
+			now = time.perf_counter()
+			dueSteps = startStep+int((now-startWall)*speed/stepTime)
+			if dueSteps-self.workerStepCount > maxStepsBehind:
+				self.scheduleSlips += 1
+				startWall = now
+				startStep = self.workerStepCount
+				dueSteps = startStep
+			if self.workerStepCount < dueSteps:
+				# catching up stops at the display frame deadline so a slow stretch still publishes every frame
+				deadline = time.perf_counter()+frameTime
+				while self.workerStepCount < dueSteps and time.perf_counter() < deadline and not self.stopWorkerEvent.is_set():
+					self.stepSimulation()
+					self.workerStepCount += 1
+				self.publishFrame()
+			nextDue = startWall+(self.workerStepCount+1-startStep)*stepTime/speed
+			self.stopWorkerEvent.wait(min(max(nextDue-time.perf_counter(), 0.0), workerSliceTime))
+		return
+
+	def runMaxThroughput(self):
+		"""
+		Steps the simulation as fast as it will go, in batches until the next display frame is due, then publishes the
+		state and briefly yields so the gui thread can draw. Returns when the mode changes or the worker is stopped.
+		"""
+		frameTime = displayFrameInterval/1000
+		while not self.stopWorkerEvent.is_set() and self.maxThroughputMode:
+			deadline = time.perf_counter()+frameTime
+			while time.perf_counter() < deadline and not self.stopWorkerEvent.is_set():
+				for i in range(throughputBatchSteps):
+					self.stepSimulation()
+				self.workerStepCount += throughputBatchSteps
+			self.publishFrame()
+			time.sleep(0)
+		return
+
+	def startSimulationWorker(self):
+		"""
+		starts the simulation worker thread and the display timer
+		"""
+		if self.simulationWorker is not None:
+			return
+		self.stopWorkerEvent.clear()
+		self.simulationWorker = threading.Thread(target=self.simulationWorkerLoop, daemon=True)
+		self.simulationWorker.start()
+		self.displayTimer.start()
+		return
+
+	def stopSimulationWorker(self):
+		"""
+		stops the simulation worker thread, waiting for the step in progress to finish, and shows the last state
+		"""
+		self.displayTimer.stop()
+		if self.simulationWorker is not None:
+			self.stopWorkerEvent.set()
+			if self.simulationWorker is not threading.current_thread():
+				self.simulationWorker.join()
+			self.simulationWorker = None
+		self.applyPendingSimulationChanges()  # requested after the worker's last step
+		self.displayFrame()
+		self.ratioReference = None
+		return
+
+	def displayFrame(self):
+		"""
+		Display timer callback, updates all gui elements from the latest published state if it has changed.
+		"""
+		self.deliverStepSamples()
+		frame = self.publishedFrame
+		if frame is None or frame is self.displayedFrame:
+			return
+		self.displayedFrame = frame
+		curState, curTime, wallTime = frame
+		frameStart = time.perf_counter()
+		vehicleTime = 0.0
+		for updater in self.stateUpdateDefList:
+			if updater == self.vehicleInstance.updateVehiclePosition:
+				updaterStart = time.perf_counter()
+				updater(curState)
+				vehicleTime += time.perf_counter()-updaterStart
+			else:
+				updater(curState)
+		for updater in self.afterUpdateDefList:
+			updater()
+		self.updateTimeLabel(curTime)
+		frameTime = time.perf_counter()-frameStart
+		# plots redraw from their own timers, so their time is what they spent redrawing since the last frame
+		plotsTime = variablePlotter.takeRedrawTime()
+		for name, newTime in (('frame ms', frameTime), ('vehicle ms', vehicleTime), ('plots ms', plotsTime)):
+			self.frameTimes[name] += performanceSmoothing*(1e3*newTime-self.frameTimes[name])
+		self.updateSpeedRatio(curTime, wallTime)
+		return
+
+	def updateSpeedRatio(self, simulationTime, wallTime):
+		"""
+		Shows the achieved simulation time/wall time ratio, measured over windows of speedRatioWindow seconds.
+		"""
+		if self.ratioReference is None:
+			self.ratioReference = (wallTime, simulationTime)
+			return
+		referenceWall, referenceSimulation = self.ratioReference
+		if wallTime-referenceWall < speedRatioWindow:
+			return
+		speedRatio = (simulationTime-referenceSimulation)/(wallTime-referenceWall)
+		self.speedRatioLabel.setText("{:.3g}x".format(speedRatio))
+		self.ratioReference = (wallTime, simulationTime)
+		self.updatePerformancePanel(speedRatio)
+		return
+
+	def updatePerformancePanel(self, speedRatio):
+		"""
+		Shows the achieved steps per second, the averaged gui frame, vehicle drawing and plot redraw times per frame and, while
+		step profiling is on, the mean cost of each phase of a simulation step.
+
+		:param speedRatio: achieved simulation time/wall time ratio
+		"""
+		self.performanceLabels['steps/s'].setText("steps/s: {:.0f}".format(speedRatio/self.simulationStepTime()))
+		for name, value in self.frameTimes.items():
+			self.performanceLabels[name].setText("{}: {:.2f}".format(name, value))
+		profiler = getattr(getattr(self, 'simulateInstance', None), 'profiler', None)
+		if self.profileStepsBox.isChecked() and profiler is not None:
+			costs = ["{} {:.1f}us".format(name, summary['meanUs']) for name, summary in profiler.summary().items() if summary['count']]
+			self.stepCostLabel.setText(", ".join(costs))
+		return
+
+	def profileStepsResponse(self, checked):
+		"""
+		Turns profiling of the simulation steps on or off, does nothing if the interface has no simulateInstance.
+		"""
+		simulateInstance = getattr(self, 'simulateInstance', None)
+		if simulateInstance is None or not hasattr(simulateInstance, 'enableProfiling'):
+			self.stepCostLabel.setText("No simulation to profile")
+			return
+		if checked:
+			self.applySimulationChange(simulateInstance.enableProfiling)
+		else:
+			self.applySimulationChange(simulateInstance.disableProfiling)
+			self.stepCostLabel.setText("")
+		return
+
+	def updateTimeLabel(self, newTime):
+		self.currentTime = newTime
+		self.currentTimeLabel.setText(str(datetime.timedelta(seconds=self.currentTime)))
+		return
+
+	def simulationErrorResponse(self, exceptionText):
+		self.raiseExceptionToUser(exceptionText)
+		self.PauseSimulation()
 		return
 
 	def speedChangedResponse(self, checked):
 		if checked.isChecked():
-			if checked.threadRate >= 1:
-				self.newSpeedRate = checked.threadRate
-				self.newMultiTickRate = 1
-			else:
-				self.newSpeedRate = 1
-				self.newMultiTickRate = int(1/checked.threadRate)
-				print(self.newMultiTickRate)
+			self.speedMultiplier = checked.speedMultiplier
+			self.ratioReference = None
+		return
+
+	def modeChangedResponse(self, index):
+		self.maxThroughputMode = (simulationModes[index] == 'Max Throughput')
+		for button in self.simulationSpeedsGroup.buttons():
+			button.setDisabled(self.maxThroughputMode)
+		self.ratioReference = None
 		return
 
 
@@ -220,7 +532,7 @@ class baseInterface(QtWidgets.QMainWindow):
 		self.playButton.setDisabled(True)
 		self.pauseButton.setDisabled(False)
 		self.simulationPaused = False
-		self.simulationTimedThread.start()
+		self.startSimulationWorker()
 		return
 
 	def PauseSimulation(self):
@@ -231,7 +543,7 @@ class baseInterface(QtWidgets.QMainWindow):
 		self.playButton.setDisabled(False)
 		self.pauseButton.setDisabled(True)
 		self.simulationPaused = True
-		self.simulationTimedThread.stop()
+		self.stopSimulationWorker()
 		return
 
 	def ResetSimulation(self):
@@ -241,12 +553,14 @@ class baseInterface(QtWidgets.QMainWindow):
 		self.playButton.setDisabled(False)
 		self.pauseButton.setDisabled(True)
 		self.simulationPaused = True
-		self.simulationTimedThread.stop()
+		self.stopSimulationWorker()
 		self.vehicleInstance.reset()
 		self.resetSimulationActions()
 		# self.updateGuiStateElements()
-		self.currentTime = 0
-		self.currentTimeLabel.setText(str(datetime.timedelta(seconds=self.currentTime)))
+		self.workerStepCount = 0
+		self.publishedFrame = None
+		self.stepSamples.clear()
+		self.updateTimeLabel(0)
 		print('reset')
 		return
 
@@ -10,20 +10,22 @@ from ..Controls import VehiclePerturbationModels
 from ..Containers import Controls
 from ..Containers import Linearized
 from ..Controls import VehicleControlGains
+from ..Containers import Serialization
 from ..Constants import VehiclePhysicalConstants
+from ..Simulation import GainsTest
+from ..Simulation import GainsOptimizer
+from ..Simulation import ResponseMetrics
 import sys
 import os
 import datetime
 
 import math
 import threading
-import pickle
-import matplotlib.pyplot as plt
-import matplotlib
-import time
+import matplotlib.figure
+import matplotlib.backends.backend_agg
 
 testGainsFileName = 'LastGainsTest.png'
-testNumSteps = 1000
+testNumSteps = GainsTest.testNumSteps
 
 lateralNames = ['Wn_roll', 'Zeta_roll', 'Wn_course', 'Zeta_course', 'Wn_sideslip', 'Zeta_sideslip']
 longitudinalNames = ['Wn_pitch', 'Zeta_pitch', 'Wn_altitude','Zeta_altitude', 'Wn_SpeedfromThrottle',
@@ -34,8 +36,10 @@ gainNames = ['kp_roll', 'kd_roll', 'ki_roll', 'kp_sideslip', 'ki_sideslip', 'kp_
                 'kp_SpeedfromElevator', 'ki_SpeedfromElevator']
 longitudinalGainNames = []
 
-defaultTuningParameterFileName = "VehicleTuningParameters_Data.pickle"
-defaultGainsFileName = "VehicleGains_Data.pickle"
+defaultTuningParameterFileName = Serialization.defaultFileName
+defaultGainsFileName = Serialization.defaultFileName
+tuningEntryName = 'controlTuning'
+gainsEntryName = 'controlGains'
 
 gainTypes = ['Roll', 'SideSlip', 'Course', 'Pitch', 'Altitude', 'Speed']
 rollNames = ['kp_roll', 'kd_roll', 'ki_roll']
@@ -62,6 +66,7 @@ class displayGainsTest(QtWidgets.QDialog):
 
 class controlGainsWidget(QtWidgets.QWidget):
 	testFinishedSignal = QtCore.pyqtSignal(bool)
+	optimizeFinishedSignal = QtCore.pyqtSignal(object)
 	def __init__(self, guiControls, callBackOnSuccesfulGains=None, parent=None):
 		super().__init__(parent)
 		self.parentInstance = parent
@@ -75,6 +80,8 @@ class controlGainsWidget(QtWidgets.QWidget):
 		self.currentLinearModel = Linearized.transferFunctions
 
 		self.testWindow = None
+		self.lastTestResults = None
+		self.lastTestError = None
 
 		topBoxEnclosure = QtWidgets.QHBoxLayout()
 		self.usedLayout.addLayout(topBoxEnclosure)
@@ -104,10 +111,8 @@ class controlGainsWidget(QtWidgets.QWidget):
 		tuningBox.addLayout(tuningFormLayout)
 		tuningBox.addStretch()
 
-		try:
-			with open(os.path.join(sys.path[0], defaultTuningParameterFileName), 'rb') as f:
-				savedParameters = pickle.load(f)
-		except (FileNotFoundError, EOFError):
+		savedParameters = Serialization.loadEntry(os.path.join(sys.path[0], defaultTuningParameterFileName), tuningEntryName)
+		if savedParameters is None:
 			savedParameters = Controls.controlTuning()
 			for pName in lateralNames+longitudinalNames:
 				setattr(savedParameters, pName, 1)
@@ -162,6 +167,10 @@ class controlGainsWidget(QtWidgets.QWidget):
 		self.testGainsButton.clicked.connect(self.startTestGains)
 		controlBox.addWidget(self.testGainsButton)
 
+		self.optimizeTuningButton = QtWidgets.QPushButton("Optimize Parameters")
+		self.optimizeTuningButton.clicked.connect(self.startOptimizeTuning)
+		controlBox.addWidget(self.optimizeTuningButton)
+
 		self.saveGainsButton = QtWidgets.QPushButton("Save Parameters and Gains")
 		self.saveGainsButton.clicked.connect(self.saveParametersGainsResponse)
 		controlBox.addWidget(self.saveGainsButton)
@@ -172,17 +181,16 @@ class controlGainsWidget(QtWidgets.QWidget):
 
 
 		self.testFinishedSignal.connect(self.gainTestOverSignal)
+		self.optimizeFinishedSignal.connect(self.optimizeOverSignal)
 		# self.gainsTextBox = QPlainTextEdit()
 		# self.gainsTextBox.setReadOnly(True)
 		# outputBox.addWidget(self.gainsTextBox)
 		# outputBox.addStretch()
 
-		try:
-			with open(os.path.join(sys.path[0], defaultGainsFileName), 'rb') as f:
-				self.curGains = pickle.load(f)
+		savedGains = Serialization.loadEntry(os.path.join(sys.path[0], defaultGainsFileName), gainsEntryName)
+		if savedGains is not None:
+			self.curGains = savedGains
 			self.updateGainsDisplay(self.curGains)
-		except (FileNotFoundError, EOFError):
-			pass
 		self.usedLayout.addStretch()
 
 	def createLinearizedModels(self, trimState=None, trimInput=None):
@@ -270,10 +278,9 @@ class controlGainsWidget(QtWidgets.QWidget):
 		"""
 		we save the gains here
 		"""
-		with open(os.path.join(sys.path[0], defaultGainsFileName), 'wb') as f:
-			pickle.dump(self.buildCurrentGains(), f)
-		with open(os.path.join(sys.path[0], defaultTuningParameterFileName), 'wb') as f:
-			pickle.dump(self.buildCurrentParameters(), f)
+		Serialization.saveEntry(os.path.join(sys.path[0], defaultGainsFileName), gainsEntryName, self.buildCurrentGains())
+		Serialization.saveEntry(os.path.join(sys.path[0], defaultTuningParameterFileName), tuningEntryName,
+								self.buildCurrentParameters())
 		self.statusText.setText("Parameters and Gains Saved")
 		return
 
@@ -307,63 +314,83 @@ class controlGainsWidget(QtWidgets.QWidget):
 		self.testGainsButton.setDisabled(True)
 		return
 
+	def startOptimizeTuning(self):
+		"""
+		starts the automatic search for tuning parameters from the current ones on a daemon thread
+		"""
+		self.statusText.setText("Optimizing Parameters, this may take a while")
+		self.optimizeTuningButton.setDisabled(True)
+		threading.Thread(target=self.runOptimizeTuning, args=(self.buildCurrentParameters(),), daemon=True).start()
+		return
+
+	def runOptimizeTuning(self, startParameters):
+		"""
+		runs the optimizer against the current reference commands and trim, emits the outcome to the gui thread. The
+		candidates are flown on this worker thread rather than in worker processes started from the gui application.
+		"""
+		refControls = self.parentInstance.referenceControl.currentReference
+		trimSettings = self.parentInstance.trimCalcWidget.currentTrimControls
+		try:
+			outcome = GainsOptimizer.optimizeTuning(startParameters, self.currentLinearModel, refControls, trimSettings,
+													  processes=0)
+		except Exception:
+			import traceback
+			outcome = traceback.format_exc()
+		self.optimizeFinishedSignal.emit(outcome)
+		return
+
+	def optimizeOverSignal(self, outcome):
+		self.optimizeTuningButton.setDisabled(False)
+		if isinstance(outcome, str):
+			self.statusText.setText('Optimization Failed')
+			self.parentInstance.raiseExceptionToUser(outcome)
+			return
+		bestParameters, convergenceLog = outcome
+		self.curParameters = bestParameters
+		self.updateParametersDisplay(self.curParameters)
+		self.statusText.setText('Parameters Optimized, cost {:.4g} after {} generations'.format(convergenceLog[-1]['bestCost'],
+																							  convergenceLog[-1]['generation']))
+		return
+
 	def gainTestOverSignal(self, itFinished):
 		self.testGainsButton.setDisabled(False)
+		if not itFinished:
+			self.statusText.setText('Test Run Failed')
+			self.parentInstance.raiseExceptionToUser(self.lastTestError)
+			return
 		self.testWindow = displayGainsTest(testGainsFileName)
-		self.statusText.setText('Test Run was Completed')
+		wantedValues, trackingErrors = self.lastTestResults
+		stepMetrics, controlEffort = ResponseMetrics.computeResponseMetrics(wantedValues)
+		self.statusText.setText('Test Run was Completed, RMS errors: ' +
+								', '.join(['{} {:.3g}'.format(name, value) for name, value in zip(GainsTest.metricNames, trackingErrors)]) +
+								'\nStep response: ' + ResponseMetrics.formatSummary(stepMetrics))
 		self.testWindow.open()
 		return
 
 	def runGainsTest(self):
-		simInstance = self.parentInstance.simulateInstance
-		simInstance.reset()  # reset the model
+		"""
+		Runs the gains test on its own copy of the closed loop model (the live simulation is not touched) and then renders
+		the plots to testGainsFileName. Runs on a daemon thread so the gui does not stall; the test is flown directly on
+		that thread rather than in a worker process, which would have to be started from the gui application.
+		"""
 		refControls = self.parentInstance.referenceControl.currentReference # grab the controls for the run
-
-		simInstance.underlyingModel.setControlGains(self.curGains)  # and make sure the gains are set
 		trimSettings = self.parentInstance.trimCalcWidget.currentTrimControls
 
-		wantedValues = dict()
-
-		wantedValues['chi'] = list()
-		wantedValues['Va'] = list()
-		wantedValues['pd'] = list()
-		wantedValues['cPitch'] = list()
-		wantedValues['aPitch'] = list()
-		wantedValues['cRoll'] = list()
-		wantedValues['aRoll'] = list()
-		wantedValues['Throttle'] = list()
-		wantedValues['Aileron'] = list()
-		wantedValues['Elevator'] = list()
-		wantedValues['Rudder'] = list()
-
-		for i in range(testNumSteps+1):
-			simInstance.takeStep(refControls)
-			curState = simInstance.getVehicleState()
-
-			wantedValues['chi'].append(math.degrees(curState.chi))
-			wantedValues['Va'].append(curState.Va)
-			wantedValues['pd'].append(-curState.pd)
-
-			wantedValues['cPitch'].append(math.degrees(refControls.commandedPitch))
-			wantedValues['aPitch'].append(math.degrees(curState.pitch))
-
-			wantedValues['cRoll'].append(math.degrees(refControls.commandedRoll))
-			wantedValues['aRoll'].append(math.degrees(curState.roll))
-
-			ActualControl = simInstance.underlyingModel.getVehicleControlSurfaces()
-
-			wantedValues['Throttle'].append(ActualControl.Throttle)
-			wantedValues['Aileron'].append(math.degrees(ActualControl.Aileron))
-			wantedValues['Elevator'].append(math.degrees(ActualControl.Elevator))
-			wantedValues['Rudder'].append(math.degrees(ActualControl.Rudder))
+		try:
+			wantedValues = GainsTest.runGainsTest(self.curGains, refControls, trimSettings, numSteps=testNumSteps)
+			trackingErrors = GainsTest.trackingMetrics(wantedValues)
+		except Exception:
+			import traceback
+			self.lastTestError = traceback.format_exc()  # reported from the gui thread
+			self.testFinishedSignal.emit(False)
+			return
+		self.lastTestResults = (wantedValues, trackingErrors)
 
-		# print(wantedValues)
-		matplotlib.use('agg')
 		plotData = list()
 		staticLength = len(wantedValues['chi'])
-		plotData.append([[math.degrees(refControls.commandedCourse)]*staticLength, wantedValues['chi'], 'Course'])
-		plotData.append([[refControls.commandedAirspeed]*staticLength, wantedValues['Va'], 'Speed'])
-		plotData.append([[refControls.commandedAltitude]*staticLength, wantedValues['pd'], 'Height'])
+		plotData.append([[wantedValues['commandedCourse']]*staticLength, wantedValues['chi'], 'Course'])
+		plotData.append([[wantedValues['commandedAirspeed']]*staticLength, wantedValues['Va'], 'Speed'])
+		plotData.append([[wantedValues['commandedAltitude']]*staticLength, wantedValues['altitude'], 'Height'])
 		plotData.append([wantedValues['cPitch'], wantedValues['aPitch'], 'Pitch'])
 		plotData.append([wantedValues['cRoll'], wantedValues['aRoll'], 'Roll'])
 		plotData.append([[trimSettings.Throttle]*staticLength, wantedValues['Throttle'], 'Throttle'])
@@ -371,24 +398,19 @@ class controlGainsWidget(QtWidgets.QWidget):
 		plotData.append([[math.degrees(trimSettings.Elevator)]*staticLength, wantedValues['Elevator'], 'Elevator'])
 		plotData.append([[math.degrees(trimSettings.Rudder)]*staticLength, wantedValues['Rudder'], 'Rudder'])
 
-		timeSteps = [VehiclePhysicalConstants.dT*x for x in range(staticLength)]
+		timeSteps = wantedValues['time']
 
+		# a figure of our own rather than the global pyplot state so that this is safe off the gui thread
+		testFigure = matplotlib.figure.Figure(figsize=(12.8, 9.6))
+		matplotlib.backends.backend_agg.FigureCanvasAgg(testFigure)
 		for index, (refValues, actualValues, plotName) in enumerate(plotData):
-			plt.subplot(3, 4, index+1)
-			ref = plt.plot(timeSteps, refValues, label='Reference') # we want the colors to match for the legend
-			act = plt.plot(timeSteps, actualValues,  label='Actual')
-			plt.title(plotName)
-
-		plt.gcf().legend(handles=(ref[0], act[0]), labels=('Reference', 'Actual'), loc='lower center')
-		# the oddity with the list is that even with single values it returns a list
-		# and if you feed it a named argument, it can't parse it correctly
-		# unnamed argument works but then matplotlib throws a warning
-		# have to use named as many of them we do not wish to use.
-
-		plt.tight_layout()
-		plt.savefig(testGainsFileName, dpi=300)
-
-		plt.close('all')
-		time.sleep(.25)
+			axes = testFigure.add_subplot(3, 4, index+1)
+			ref = axes.plot(timeSteps, refValues, label='Reference') # we want the colors to match for the legend
+			act = axes.plot(timeSteps, actualValues,  label='Actual')
+			axes.set_title(plotName)
+
+		testFigure.legend(handles=(ref[0], act[0]), labels=('Reference', 'Actual'), loc='lower center')
+		testFigure.tight_layout()
+		testFigure.savefig(testGainsFileName, dpi=300)
 		self.testFinishedSignal.emit(True)
-		return
\ No newline at end of file
+		return
@@ -1,11 +1,61 @@
 """
 	This module provides a wrapper for the pyqtgraph plotwidget and allowing for a simplified thread safe interface. After
 	initialziation the normal usage only involves invoking :func:`addDataPoint` to add data to a plot.
+
+	By default every point of the run is kept, in buffers that grow by doubling. Giving maxPoints instead keeps only the most
+	recent maxPoints samples of each line in a preallocated ring buffer, so the memory used does not grow with the length
+	of a run. The plot is only redrawn from a timer at display rate when new points have arrived. Many samples can be
+	added at once with :func:`addDataPoints`, and when the window holds more points than the plot is pixels wide the lines
+	are drawn from the minimum and maximum of each pixel column. The time spent in redraws, summed over every plotter, is
+	read (and reset) with :func:`takeRedrawTime`.
 """
 import PyQt5.QtCore as QtCore
 import PyQt5.QtWidgets as QtWidgets
 import pyqtgraph
+import numpy
 import sys
+import time
+
+initialCapacity = 1024	# points allocated for each line before the buffers first grow, when all points are kept
+redrawInterval = 33		# [ms] between redraws of the plot when new data has arrived
+decimationFactor = 4	# min/max decimation starts once there are more than this many points per pixel
+
+_redrawTime = 0.0	# [s] spent in _redraw by every plotter since takeRedrawTime was last called
+
+
+def takeRedrawTime():
+	"""
+	Returns the time spent redrawing plots, summed over every variablePlotter, since the last call and starts counting
+	again. Redraws run on the gui thread, so this should be called from the gui thread as well.
+
+	:return: redraw time [s]
+	"""
+	global _redrawTime
+	redrawTime = _redrawTime
+	_redrawTime = 0.0
+	return redrawTime
+
+
+def peakDecimate(timePoints, dataPoints, numBins):
+	"""
+	Reduces lines to numBins bins of equal numbers of points, keeping the minimum and the maximum of every bin so that
+	peaks stay visible. The oldest points that do not fill a whole bin are dropped.
+
+	:param timePoints: numpy array [points] of x coordinates
+	:param dataPoints: numpy array [lines x points]
+	:param numBins: number of bins to reduce to
+	:return: x coordinates [2*numBins], data [lines x 2*numBins]
+	"""
+	binSize = len(timePoints) // numBins
+	used = binSize*numBins
+	start = len(timePoints)-used
+	binnedData = dataPoints[:, start:].reshape(dataPoints.shape[0], numBins, binSize)
+	decimatedData = numpy.empty((dataPoints.shape[0], numBins, 2))
+	numpy.min(binnedData, axis=2, out=decimatedData[:, :, 0])
+	numpy.max(binnedData, axis=2, out=decimatedData[:, :, 1])
+	binnedTime = timePoints[start:].reshape(numBins, binSize)
+	decimatedTime = numpy.stack((binnedTime[:, 0], binnedTime[:, -1]), axis=1)
+	return decimatedTime.reshape(2*numBins), decimatedData.reshape(dataPoints.shape[0], 2*numBins)
 
 
 class variablePlotter(pyqtgraph.PlotWidget):
@@ -14,7 +64,8 @@ class variablePlotter(pyqtgraph.PlotWidget):
 		involves invoking :func:`addDataPoint` to add data to a plot.
 	"""
 	newDataSignal = QtCore.pyqtSignal(list, object)
-	def __init__(self, plotNames, title=None, xLabel=None, yLabel=None, useLegend=True , parent=None):
+	newDataBatchSignal = QtCore.pyqtSignal(object, object)
+	def __init__(self, plotNames, title=None, xLabel=None, yLabel=None, useLegend=True , parent=None, maxPoints=None):
 		"""
 		Creates a new variablePlotter. Only required item is a list containing names for each plot.
 
@@ -23,16 +74,27 @@ class variablePlotter(pyqtgraph.PlotWidget):
 		:param xLabel: Label x-axis if desired, appears on the bottom
 		:param yLabel: Label y-axis if desired, appears on the left
 		:param useLegend: display legend of plots given by plotNames
+		:param maxPoints: number of most recent points shown, older points slide out of the plot. None keeps every point.
 		"""
 		super().__init__(parent)
 		self.plotNames = plotNames
 		self.plotHandles = list()
-		self.dataPoints = list()
-		self.timePoints = list()
+		self.maxPoints = maxPoints
+		if maxPoints is None:
+			self.timeBuffer = numpy.zeros(initialCapacity)
+			self.dataBuffer = numpy.zeros((len(plotNames), initialCapacity))
+		else:
+			# ring buffers are twice the window length and every point is written twice (at i and i+maxPoints) so that the
+			# current window is always one contiguous slice that can be handed to the plot without copying
+			self.timeBuffer = numpy.zeros(2*maxPoints)
+			self.dataBuffer = numpy.zeros((len(plotNames), 2*maxPoints))
+		self.writeIndex = 0
+		self.pointCount = 0
+		self.lastTime = None
+		self.dirty = False
 		if useLegend:
 			self.getPlotItem().addLegend()
 		for x, name in enumerate(self.plotNames):
-			self.dataPoints.append(list())
 			self.plotHandles.append(self.getPlotItem().plot(name=name, pen=pyqtgraph.intColor(x)))
 
 		if title is not None:
@@ -43,8 +105,33 @@ class variablePlotter(pyqtgraph.PlotWidget):
 			self.getPlotItem().setLabel('left', yLabel)
 
 		self.newDataSignal.connect(self._ProcessNewPlotData)
+		self.newDataBatchSignal.connect(self._ProcessNewPlotDataBatch)
+
+		self.redrawTimer = QtCore.QTimer(self)
+		self.redrawTimer.timeout.connect(self._redraw)
+		self.redrawTimer.start(redrawInterval)
 		return
 
+	@property
+	def timePoints(self):
+		"""
+		x coordinates of the points currently in the window (view into the buffer, copy before keeping)
+		"""
+		if self.maxPoints is None:
+			return self.timeBuffer[:self.pointCount]
+		start = (self.writeIndex - self.pointCount) % self.maxPoints
+		return self.timeBuffer[start:start+self.pointCount]
+
+	@property
+	def dataPoints(self):
+		"""
+		Array [lines x points] of the points currently in the window (view into the buffer, copy before keeping)
+		"""
+		if self.maxPoints is None:
+			return self.dataBuffer[:, :self.pointCount]
+		start = (self.writeIndex - self.pointCount) % self.maxPoints
+		return self.dataBuffer[:, start:start+self.pointCount]
+
 	def addDataPoint(self, newDataPoint, t=None):
 		"""
 		Adds one data plot for each line with an optional timestep via thread safe signal. Does not update the plot itself.
@@ -54,27 +141,112 @@ class variablePlotter(pyqtgraph.PlotWidget):
 		"""""
 		self.newDataSignal.emit(newDataPoint, t)
 
+	def addDataPoints(self, newData, t=None):
+		"""
+		Adds many points to every line at once via a single thread safe signal. Does not update the plot itself.
+
+		:param newData: array like [lines x points], one row of new points for each line in plot.
+		:param t: array like [points] of x coordinates. If not present points continue counting from the last point.
+		"""
+		newData = numpy.array(newData, dtype=float, ndmin=2)
+		if t is not None:
+			t = numpy.array(t, dtype=float, ndmin=1)
+		self.newDataBatchSignal.emit(newData, t)
+
 	def clearDataPoints(self):
 		"""
 		Clears data for associated lines in plot
 		"""
-		self.timePoints.clear()
-		for dataList, plotHandle in zip(self.dataPoints, self.plotHandles):
-			dataList.clear()
-			plotHandle.setData(self.timePoints, dataList)
+		self.writeIndex = 0
+		self.pointCount = 0
+		self.lastTime = None
+		self.dirty = True
+		self._redraw()
+
+	def _reserve(self, count):
+		"""
+		Grows the buffers (when every point is kept) so that count more points fit.
+		"""
+		needed = self.pointCount+count
+		if needed <= len(self.timeBuffer):
+			return
+		capacity = max(2*len(self.timeBuffer), needed)
+		timeBuffer = numpy.zeros(capacity)
+		dataBuffer = numpy.zeros((self.dataBuffer.shape[0], capacity))
+		timeBuffer[:self.pointCount] = self.timeBuffer[:self.pointCount]
+		dataBuffer[:, :self.pointCount] = self.dataBuffer[:, :self.pointCount]
+		self.timeBuffer = timeBuffer
+		self.dataBuffer = dataBuffer
 
 	def _ProcessNewPlotData(self, newDataPoint, t=None):
 		if t is None:
-			try:
-				self.timePoints.append(self.timePoints[-1]+1)
-			except IndexError:
-				self.timePoints.append(0)
-		else:
-			self.timePoints.append(t)
-		for dataPoint, dataList, plotHandle in zip(newDataPoint, self.dataPoints, self.plotHandles):
-			dataList.append(dataPoint)
-			plotHandle.setData(self.timePoints, dataList)
-			# print(dataPoint)
+			t = 0 if self.lastTime is None else self.lastTime+1
+		self.lastTime = t
+		if self.maxPoints is None:
+			self._reserve(1)
+			index = self.pointCount
+			self.timeBuffer[index] = t
+			for line, dataPoint in enumerate(newDataPoint[:len(self.plotHandles)]):
+				self.dataBuffer[line, index] = dataPoint
+			self.pointCount += 1
+			self.dirty = True
+			return
+		index = self.writeIndex
+		self.timeBuffer[index] = self.timeBuffer[index+self.maxPoints] = t
+		for line, dataPoint in enumerate(newDataPoint[:len(self.plotHandles)]):
+			self.dataBuffer[line, index] = self.dataBuffer[line, index+self.maxPoints] = dataPoint
+		self.writeIndex = (index+1) % self.maxPoints
+		self.pointCount = min(self.pointCount+1, self.maxPoints)
+		self.dirty = True
+
+	def _ProcessNewPlotDataBatch(self, newData, t=None):
+		count = newData.shape[1]
+		if count == 0:
+			return
+		if t is None:
+			first = 0 if self.lastTime is None else self.lastTime+1
+			t = numpy.arange(first, first+count, dtype=float)
+		self.lastTime = t[-1]
+		if self.maxPoints is None:
+			self._reserve(count)
+			lines = min(newData.shape[0], len(self.plotHandles))
+			self.timeBuffer[self.pointCount:self.pointCount+count] = t
+			self.dataBuffer[:lines, self.pointCount:self.pointCount+count] = newData[:lines]
+			self.pointCount += count
+			self.dirty = True
+			return
+		if count > self.maxPoints:  # only the newest points fit in the window
+			skipped = count-self.maxPoints
+			self.writeIndex = (self.writeIndex+skipped) % self.maxPoints
+			newData = newData[:, skipped:]
+			t = t[skipped:]
+			count = self.maxPoints
+		lines = min(newData.shape[0], len(self.plotHandles))
+		positions = (self.writeIndex+numpy.arange(count)) % self.maxPoints
+		for offset in (0, self.maxPoints):
+			self.timeBuffer[positions+offset] = t
+			self.dataBuffer[:lines, positions+offset] = newData[:lines]
+		self.writeIndex = (self.writeIndex+count) % self.maxPoints
+		self.pointCount = min(self.pointCount+count, self.maxPoints)
+		self.dirty = True
+
+	def _redraw(self):
+		"""
+		Pushes the current window to the plot lines, only if points were added or cleared since the last redraw.
+		"""
+		global _redrawTime
+		if not self.dirty:
+			return
+		redrawStart = time.perf_counter()
+		self.dirty = False
+		timePoints = self.timePoints
+		dataPoints = self.dataPoints
+		numBins = max(int(self.getPlotItem().getViewBox().width()), 1)
+		if len(timePoints) > decimationFactor*numBins:
+			timePoints, dataPoints = peakDecimate(timePoints, dataPoints, numBins)
+		for line, plotHandle in enumerate(self.plotHandles):
+			plotHandle.setData(timePoints, dataPoints[line])
+		_redrawTime += time.perf_counter()-redrawStart
 
 
 if QtCore.__name__ == "__main__":
@@ -17,13 +17,52 @@ defaultZoomTick = 3
 
 metersToPixelRatio = 1
 
+defaultMaxTrailLength = 10000	# most recent points kept in the plane trail unless given to vehicleDisplay
+trailSegmentLength = 500	# points per trail segment, only the newest segment is uploaded again when a point is added
+trailMinDistance = 0.5	# [m] a new trail point is only added once the plane is this far from the last one
+trailColor = (1., 0., 0., 1)
+
+fleetPositionNames = ['pn', 'pe', 'pd', 'yaw', 'pitch', 'roll']
+
+
+def fleetPositionsFromStates(stateArray):
+	"""
+	Picks the positions needed by updateFleetPositions out of a batch of states in vehicleState order.
+
+	:param stateArray: numpy array [n x 12] of [pn, pe, pd, u, v, w, yaw, pitch, roll, p, q, r]
+	:return: numpy array [n x 6] of [pn, pe, pd, yaw, pitch, roll]
+	"""
+	return numpy.asarray(stateArray, dtype=float)[:, [0, 1, 2, 6, 7, 8]]
+
+
+def fleetPositionsFromRecordings(header, recordings, sampleIndex, prefix='state'):
+	"""
+	Picks the positions of every run of a set of recorded runs (such as a Monte Carlo study) at one sample, from data in
+	the layout written by Simulate.exportToCSV / exportToPickle, i.e. columns named state.pn, state.pe and so on.
+
+	:param header: list of column names
+	:param recordings: list of recorded runs, each [samples x columns] (list of lists or array)
+	:param sampleIndex: sample to take from every run, runs shorter than this use their last sample
+	:param prefix: name the states were recorded under
+	:return: numpy array [n x 6] of [pn, pe, pd, yaw, pitch, roll]
+	"""
+	columns = [header.index('{}.{}'.format(prefix, name)) for name in fleetPositionNames]
+	positions = numpy.empty((len(recordings), len(columns)))
+	for index, recorded in enumerate(recordings):
+		sample = recorded[min(sampleIndex, len(recorded)-1)]
+		positions[index] = [sample[column] for column in columns]
+	return positions
+
 testLine = [[2, 2, 2], [2, 0, 100], [-2, 0, 100]]
 
 class vehicleDisplay(QtWidgets.QWidget):
 	updateVehiclePositionSignal = QtCore.pyqtSignal(list)
-	def __init__(self, parent=None):
+	updateFleetPositionsSignal = QtCore.pyqtSignal(object, object)
+	def __init__(self, parent=None, maxTrailLength=defaultMaxTrailLength):
 		"""
 		sets up the full window with the plane along with a row of camera controls
+
+		:param maxTrailLength: most recent points kept in the plane trail, rounded up to whole trail segments
 		"""
 		super().__init__(parent)
 
@@ -31,6 +70,9 @@ class vehicleDisplay(QtWidgets.QWidget):
 		self.setLayout(self.usedLayout)
 		self.trackPlane = True
 		self.leavePlaneTrail = True
+		self.useArrayTransform = False	# use VehicleGeometry.getNewPointsArray rather than getNewPoints, see setArrayTransformMode
+		self.useModelTransform = False	# mesh uploaded once and moved with a model matrix, see setModelTransformMode
+		self.lastVehiclePosition = [0, 0, 0, 0, 0, 0]
 
 		self.lastPlanePos = pyqtgraph.Vector(0, 0, 0)
 
@@ -51,9 +93,9 @@ class vehicleDisplay(QtWidgets.QWidget):
 		# a copy of the vehicle, we assume we will always want a vehicle
 		self.vehicleDrawInstance = VehicleGeometry.VehicleGeometry()
 
-		# we need to grab the vertices for the vehicle each update
-		rawPoints = [[y*metersToPixelRatio for y in x] for x in self.vehicleDrawInstance.getNewPoints(0, 0, 0, 0, 0, 0)]
-		newVertices = numpy.array(rawPoints)
+		# we need to grab the vertices for the vehicle each update, into a buffer that is reused every frame
+		self.vertexBuffer = numpy.empty(self.vehicleDrawInstance.verticesArray.shape)
+		newVertices = self.getVehicleVertices([0, 0, 0, 0, 0, 0])
 
 		# faces and colors only need to be done once
 		newFaces = numpy.array(self.vehicleDrawInstance.faces)
@@ -75,13 +117,31 @@ class vehicleDisplay(QtWidgets.QWidget):
 		self.openGLWindow.addItem(self.Axis)
 		self.updateVehiclePositionSignal.connect(self.drawNewVehiclePosition)
 
+		# many vehicles are drawn as one combined mesh, created on the first fleet update
+		self.fleetMeshItem = None
+		self.fleetMeshData = None
+		self.fleetVertexBuffer = None
+		self.fleetColors = None
+		self.updateFleetPositionsSignal.connect(self.drawFleetPositions)
+
 		#  we are going to add a line for tracking the plane here, if not on it does nothing
-		self.planeTrailLine = pyqtgraph.opengl.GLLinePlotItem()
-		# self.planeTrailLine.setData(color=PyQt5.QtGui.QColor("red"), width=2)
-		self.planeTrailLine.setData(color=(1, 0, 0, 1), width=1)
-		self.openGLWindow.addItem(self.planeTrailLine)
-		self.planeTrailLine.mode = 'line_strip'
-		self.planeTrailPoints = list()
+		# the trail is drawn as trailSegmentCount line strips of up to trailSegmentLength points each. Only the segment
+		# being filled is uploaded again when a point is added, full segments are left alone, and once every segment is
+		# full the oldest one is cleared and reused. Each segment after the first starts with the last point of the one
+		# before it so that the strips join up.
+		self.trailSegmentCount = max(1, -(-maxTrailLength // trailSegmentLength))
+		self.maxTrailLength = self.trailSegmentCount*trailSegmentLength
+		self.planeTrailLines = list()
+		for index in range(self.trailSegmentCount):
+			newTrailLine = pyqtgraph.opengl.GLLinePlotItem()
+			newTrailLine.setData(color=trailColor, width=1)
+			newTrailLine.mode = 'line_strip'
+			self.openGLWindow.addItem(newTrailLine)
+			self.planeTrailLines.append(newTrailLine)
+		self.planeTrailBuffer = numpy.zeros((self.trailSegmentCount, trailSegmentLength+1, 3))
+		self.planeTrailCounts = [0]*self.trailSegmentCount	# points in each segment, including the joining point
+		self.planeTrailJoined = [False]*self.trailSegmentCount	# True if the segment starts with the joining point
+		self.planeTrailSegment = 0	# segment being filled
 
 
 		self.aribtraryLines = list()
@@ -155,23 +215,170 @@ class vehicleDisplay(QtWidgets.QWidget):
 		# print(newPosition)
 		# we simply create a new set of vertices
 
-		rawPoints = self.vehicleDrawInstance.getNewPoints(*newPosition)
-		# print(rawPoints)
-		newVertices = numpy.array([[y * metersToPixelRatio for y in x] for x in rawPoints])
-		# print(newVertices)
-		self.vehicleMeshData.setVertexes(newVertices)  # update our mesh with them
-		self.openGLVehicle.setMeshData(meshdata=self.vehicleMeshData, smooth=False, computeNormals=False)  # and setMeshData automatically invokes a redraw
+		self.lastVehiclePosition = newPosition
+		if self.useModelTransform:
+			# only the 16 numbers of the model matrix change, the vertices stay on the graphics card
+			modelMatrix = self.vehicleDrawInstance.getModelMatrix(*newPosition, scale=metersToPixelRatio)
+			self.openGLVehicle.setTransform(pyqtgraph.Transform3D(*modelMatrix.ravel()))  # setTransform invokes a redraw
+		else:
+			newVertices = self.getVehicleVertices(newPosition)
+			self.vehicleMeshData.setVertexes(newVertices)  # update our mesh with them
+			self.openGLVehicle.setMeshData(meshdata=self.vehicleMeshData, smooth=False, computeNormals=False)  # and setMeshData automatically invokes a redraw
 		self.lastPlanePos = pyqtgraph.Vector(newPosition[1], newPosition[0], -newPosition[2])
 		if self.trackPlane:
 			self.openGLWindow.setCameraPosition(pos=self.lastPlanePos)
 		if self.leavePlaneTrail:
-			self.planeTrailPoints.append([newPosition[1], newPosition[0], -newPosition[2]])
-			hmm = numpy.array(self.planeTrailPoints)
-			tempColor = numpy.array([[1., 0., 0., 1]])
-			colors = numpy.tile(tempColor, (hmm.shape[0], 1))
-			self.planeTrailLine.setData(pos=numpy.array(self.planeTrailPoints), color=colors)
+			self.addPlaneTrailPoint([newPosition[1], newPosition[0], -newPosition[2]])
+		return
+
+	@property
+	def planeTrailPoints(self):
+		"""
+		Current trail points in ENU, oldest first (a copy of the segments)
+		"""
+		segments = list()
+		for offset in range(1, self.trailSegmentCount+1):
+			segment = (self.planeTrailSegment + offset) % self.trailSegmentCount
+			start = 1 if self.planeTrailJoined[segment] else 0
+			segments.append(self.planeTrailBuffer[segment, start:self.planeTrailCounts[segment]])
+		return numpy.concatenate(segments)
+
+	def addPlaneTrailPoint(self, newPoint):
+		"""
+		Adds a point to the plane trail if it is at least trailMinDistance from the last one, and only then updates the line.
+
+		:param newPoint: [east, north, up] position
+		"""
+		segment = self.planeTrailSegment
+		count = self.planeTrailCounts[segment]
+		if count > 0:
+			lastPoint = self.planeTrailBuffer[segment, count-1]
+			if (newPoint[0]-lastPoint[0])**2 + (newPoint[1]-lastPoint[1])**2 + (newPoint[2]-lastPoint[2])**2 < trailMinDistance**2:
+				return
+		if count == trailSegmentLength+1:  # segment is full, continue in the oldest one
+			segment = (segment + 1) % self.trailSegmentCount
+			self.planeTrailBuffer[segment, 0] = lastPoint
+			self.planeTrailJoined[segment] = True
+			self.planeTrailSegment = segment
+			count = 1
+		self.planeTrailBuffer[segment, count] = newPoint
+		count += 1
+		self.planeTrailCounts[segment] = count
+		self.planeTrailLines[segment].setData(pos=self.planeTrailBuffer[segment, :count], color=trailColor)
 		return
 
+	def clearPlaneTrail(self):
+		"""
+		Removes all points from the plane trail
+		"""
+		self.planeTrailCounts = [0]*self.trailSegmentCount
+		self.planeTrailJoined = [False]*self.trailSegmentCount
+		self.planeTrailSegment = 0
+		for trailLine in self.planeTrailLines:
+			trailLine.setData(pos=self.planeTrailBuffer[0, :0], color=trailColor)
+		return
+
+	def updateFleetPositions(self, positions, colors=None):
+		"""
+		Updates the positions of a fleet of vehicles drawn in addition to the main vehicle (thread safe)
+
+		:param positions: array like [n x 6] of [pn, pe, pd, yaw, pitch, roll] for each vehicle, see
+			fleetPositionsFromStates and fleetPositionsFromRecordings
+		:param colors: optional [n x 4] RGBA color of each vehicle, every vehicle gets its own hue if None
+		"""
+		self.updateFleetPositionsSignal.emit(numpy.array(positions, dtype=float, ndmin=2),
+											 None if colors is None else numpy.array(colors, dtype=float, ndmin=2))
+		return
+
+	def drawFleetPositions(self, positions, colors=None):
+		"""
+		Handles update of the fleet in the window, NEVER CALLED directly. All vehicles are transformed in one batched
+		operation into a single combined vertex buffer and drawn as one mesh; faces and colors are only rebuilt when the
+		number of vehicles or their colors change.
+
+		:param positions: numpy array [n x 6]
+		:param colors: numpy array [n x 4] or None
+		"""
+		vehicleCount = positions.shape[0]
+		vertexCount = self.vehicleDrawInstance.verticesArray.shape[0]
+		rebuild = self.fleetVertexBuffer is None or self.fleetVertexBuffer.shape[0] != vehicleCount
+		if colors is None and (rebuild or self.fleetColors is None):
+			colors = numpy.array([pyqtgraph.intColor(index, hues=max(vehicleCount, 1)).getRgbF() for index in range(vehicleCount)])
+		if colors is not None and (self.fleetColors is None or not numpy.array_equal(colors, self.fleetColors)):
+			self.fleetColors = colors
+			rebuild = True
+
+		if rebuild:
+			self.fleetVertexBuffer = numpy.empty((vehicleCount, vertexCount, 3))
+		self.vehicleDrawInstance.getNewPointsArray(*positions.T, scale=metersToPixelRatio, out=self.fleetVertexBuffer)
+		newVertices = self.fleetVertexBuffer.reshape(vehicleCount*vertexCount, 3)
+
+		if rebuild:
+			baseFaces = numpy.array(self.vehicleDrawInstance.faces)
+			newFaces = (baseFaces[numpy.newaxis, :, :] + vertexCount*numpy.arange(vehicleCount)[:, numpy.newaxis, numpy.newaxis]).reshape(-1, 3)
+			newColors = numpy.repeat(self.fleetColors, baseFaces.shape[0], axis=0)
+			self.fleetMeshData = pyqtgraph.opengl.MeshData(vertexes=newVertices, faces=newFaces, faceColors=newColors)
+			if self.fleetMeshItem is None:
+				self.fleetMeshItem = pyqtgraph.opengl.GLMeshItem(meshdata=self.fleetMeshData, drawEdges=False, smooth=False, computeNormals=False)
+				self.openGLWindow.addItem(self.fleetMeshItem)
+		else:
+			self.fleetMeshData.setVertexes(newVertices)
+		self.fleetMeshItem.setMeshData(meshdata=self.fleetMeshData, smooth=False, computeNormals=False)
+		return
+
+	def clearFleet(self):
+		"""
+		Removes the fleet from the window
+		"""
+		if self.fleetMeshItem is not None:
+			self.openGLWindow.removeItem(self.fleetMeshItem)
+		self.fleetMeshItem = None
+		self.fleetMeshData = None
+		self.fleetVertexBuffer = None
+		self.fleetColors = None
+		return
+
+	def setArrayTransformMode(self, enabled):
+		"""
+		Switches the vertices drawn every frame between VehicleGeometry.getNewPoints (the default, so the display shows
+		the student's own transform) and the NumPy getNewPointsArray, which is faster but does not use getNewPoints.
+
+		:param enabled: True to use getNewPointsArray
+		"""
+		self.useArrayTransform = enabled
+		self.drawNewVehiclePosition(self.lastVehiclePosition)
+		return
+
+	def setModelTransformMode(self, enabled):
+		"""
+		Switches between moving the vehicle by rewriting its vertices every frame (the default, see
+		setArrayTransformMode for how they are computed) and uploading the body frame mesh once and only updating the
+		model matrix of the mesh item each frame, which makes the cost of drawing independent of the size of the mesh.
+		The model matrix comes from VehicleGeometry.getModelMatrix, so getNewPoints is not used while this is enabled.
+
+		:param enabled: True to use the model matrix
+		"""
+		self.useModelTransform = enabled
+		if enabled:
+			self.vehicleMeshData.setVertexes(self.vehicleDrawInstance.verticesArray)
+			self.openGLVehicle.setMeshData(meshdata=self.vehicleMeshData, smooth=False, computeNormals=False)
+		else:
+			self.openGLVehicle.resetTransform()
+		self.drawNewVehiclePosition(self.lastVehiclePosition)
+		return
+
+	def getVehicleVertices(self, newPosition):
+		"""
+		Vertices of the vehicle at a position, scaled by metersToPixelRatio
+
+		:param newPosition: [pn, pe, pd, yaw, pitch, roll] as a list
+		:return: numpy array [n x 3] of ENU points
+		"""
+		if self.useArrayTransform:
+			return self.vehicleDrawInstance.getNewPointsArray(*newPosition, scale=metersToPixelRatio, out=self.vertexBuffer)
+		rawPoints = self.vehicleDrawInstance.getNewPoints(*newPosition)
+		return numpy.array([[y * metersToPixelRatio for y in x] for x in rawPoints])
+
 	def ZoomIn(self):
 		"""
 		Zooms in by default tick
@@ -222,7 +429,7 @@ class vehicleDisplay(QtWidgets.QWidget):
 		resets the elements that need to be reset
 		"""
 		self.resetCameraView()
-		self.planeTrailPoints.clear()
+		self.clearPlaneTrail()
 		if resetState is not None:
 			self.updateVehiclePosition(resetState)
 		else:
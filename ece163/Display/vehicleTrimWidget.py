@@ -8,15 +8,17 @@ import PyQt5.QtWidgets as QtWidgets
 import ece163.Constants.VehiclePhysicalConstants as VehiclePhysicalConstants
 from . import doubleInputWithLabel
 from ..Controls import VehicleTrim
+from ..Containers import Serialization
 import sys
 import os
-import pickle
 
 import math
 import threading
 
 defaultTrimParameters = [('Airspeed', VehiclePhysicalConstants.InitialSpeed), ('Climb Angle', 0), ('Turn Radius', math.inf)]
-defaultTrimFileName = 'VehicleTrim_Data.pickle'
+defaultTrimFileName = Serialization.defaultFileName
+trimStateEntryName = 'trimState'
+trimControlsEntryName = 'trimControls'
 
 
 class vehicleTrimWidget(QtWidgets.QWidget):
@@ -37,9 +39,10 @@ class vehicleTrimWidget(QtWidgets.QWidget):
 		self.trimInstance = VehicleTrim.VehicleTrim()
 
 		try:
-			with open(os.path.join(sys.path[0], defaultTrimFileName), 'rb') as f:
-				self.currentTrimState, self.currentTrimControls = pickle.load(f)
-		except FileNotFoundError:
+			savedEntries = Serialization.loadEntries(os.path.join(sys.path[0], defaultTrimFileName))
+			self.currentTrimState = savedEntries[trimStateEntryName]
+			self.currentTrimControls = savedEntries[trimControlsEntryName]
+		except (FileNotFoundError, ValueError, KeyError):
 			self.currentTrimState = self.trimInstance.getTrimState()
 			self.currentTrimControls = self.trimInstance.getTrimControls()
 		valueInputsBox = QtWidgets.QHBoxLayout()
@@ -158,6 +161,6 @@ class vehicleTrimWidget(QtWidgets.QWidget):
 		calls the trim with the path so we export the trimstate and inputs
 		"""
 		trimExportPath = os.path.join(sys.path[0], defaultTrimFileName)
-		with open(trimExportPath, 'wb') as f:
-			pickle.dump((self.currentTrimState, self.currentTrimControls), f)
+		Serialization.updateEntries(trimExportPath, {trimStateEntryName: self.currentTrimState,
+													 trimControlsEntryName: self.currentTrimControls})
 		return
\ No newline at end of file
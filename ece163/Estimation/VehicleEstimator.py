@@ -0,0 +1,295 @@
+"""
+State estimation from the noisy sensors of SensorsModel. A complementary filter estimates the attitude and the gyro biases
+from the gyros, accelerometers and magnetometers, and an extended Kalman filter estimates the position and the inertial
+velocity from the accelerometers (rotated with the estimated attitude) and the GPS. VehicleEstimator combines the two into
+a stage that is updated once per simulation step and runs each filter at its own rate.
+
+The filters are written for a fixed, small state in plain Python (unrolled 3x3 rotations, 6x6 covariance as nested lists
+with sequential scalar measurement updates, so no matrix inverse is needed), which is much cheaper per call than general
+matrix routines or NumPy on arrays this size and keeps the stage affordable at 100 Hz.
+"""
+
+import math
+
+from ..Containers import States
+from ..Constants import VehiclePhysicalConstants as VPC
+from ..Constants import VehicleSensorConstants as VSC
+
+kpAccel = 2.0			# complementary filter proportional gain on the accelerometer (gravity direction) error
+kiAccel = 0.2			# complementary filter integral (gyro bias) gain on the accelerometer error
+kpMag = 2.0				# complementary filter proportional gain on the magnetometer (heading) error
+kiMag = 0.2				# complementary filter integral (gyro bias) gain on the magnetometer error
+accelGate = 0.1			# accelerometer is only trusted when its magnitude is within this fraction of g0
+
+accelProcessSigma = 1.0				# [m/s^2] acceleration uncertainty driving the position/velocity filter
+initialPositionSigma = 10.0			# [m] position uncertainty before the first GPS fix
+initialVelocitySigma = 5.0			# [m/s] velocity uncertainty before the first GPS fix
+minimumCourseSpeed = 1.0			# [m/s] below this speed over ground the GPS course is not used
+
+magneticReference = [component[0] / VSC.magfieldTotal for component in VSC.magfield]	# unit field vector, NED
+
+class ComplementaryAttitudeFilter():
+	def __init__(self):
+		"""
+		Attitude complementary filter (explicit complementary filter on the direction cosine matrix): the gyros, less
+		their estimated biases, are integrated and the result is pulled towards the gravity direction measured by the
+		accelerometers and, in heading only, towards the magnetic field measured by the magnetometers. The same errors
+		drive the gyro bias estimates.
+		"""
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Restarts from level, heading north, with zero gyro biases.
+		"""
+		self.R = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]	# inertial to body
+		self.bias = [0.0, 0.0, 0.0]
+		self.rates = [0.0, 0.0, 0.0]
+		return
+
+	def update(self, sensors, dT):
+		"""
+		Advances the attitude estimate by dT with one set of measurements.
+
+		:param sensors: vehicleSensors (noisy)
+		:param dT: time since the last update [s]
+		"""
+		R = self.R
+		R0, R1, R2 = R
+		# estimated gravity direction (down) and magnetic field in the body frame
+		dx, dy, dz = R0[2], R1[2], R2[2]
+		mr0, mr1, mr2 = magneticReference
+		mx = R0[0] * mr0 + R0[1] * mr1 + R0[2] * mr2
+		my = R1[0] * mr0 + R1[1] * mr1 + R1[2] * mr2
+		mz = R2[0] * mr0 + R2[1] * mr1 + R2[2] * mr2
+
+		ex = ey = ez = 0.0
+		ix = iy = iz = 0.0
+		ax, ay, az = sensors.accel_x, sensors.accel_y, sensors.accel_z
+		accelNorm = math.sqrt(ax * ax + ay * ay + az * az)
+		if abs(accelNorm - VPC.g0) < accelGate * VPC.g0:
+			# measured down direction is opposite the specific force, error is measured x estimated
+			ax, ay, az = -ax / accelNorm, -ay / accelNorm, -az / accelNorm
+			cx, cy, cz = ay * dz - az * dy, az * dx - ax * dz, ax * dy - ay * dx
+			ex, ey, ez = kpAccel * cx, kpAccel * cy, kpAccel * cz
+			ix, iy, iz = kiAccel * cx, kiAccel * cy, kiAccel * cz
+		bx, by, bz = sensors.mag_x, sensors.mag_y, sensors.mag_z
+		magNorm = math.sqrt(bx * bx + by * by + bz * bz)
+		if magNorm > 0.0:
+			bx, by, bz = bx / magNorm, by / magNorm, bz / magNorm
+			# only the component about the down axis, so the magnetometer does not disturb roll and pitch
+			heading = (by * mz - bz * my) * dx + (bz * mx - bx * mz) * dy + (bx * my - by * mx) * dz
+			ex += kpMag * heading * dx
+			ey += kpMag * heading * dy
+			ez += kpMag * heading * dz
+			ix += kiMag * heading * dx
+			iy += kiMag * heading * dy
+			iz += kiMag * heading * dz
+
+		bias = self.bias
+		bias[0] -= ix * dT
+		bias[1] -= iy * dT
+		bias[2] -= iz * dT
+		p = sensors.gyro_x - bias[0]
+		q = sensors.gyro_y - bias[1]
+		r = sensors.gyro_z - bias[2]
+		self.rates = [p, q, r]
+
+		# R <- exp(-[w x] dT) R (Rodrigues), with the feedback added to the corrected rates
+		wx, wy, wz = (p + ex) * dT, (q + ey) * dT, (r + ez) * dT
+		angle = math.sqrt(wx * wx + wy * wy + wz * wz)
+		if angle > 1e-12:
+			s = math.sin(angle) / angle
+			c = (1.0 - math.cos(angle)) / (angle * angle)
+		else:
+			s, c = 1.0, 0.5
+		xx, yy, zz, xy, xz, yz = wx * wx, wy * wy, wz * wz, wx * wy, wx * wz, wy * wz
+		E = [[1.0 - c * (yy + zz), s * wz + c * xy, -s * wy + c * xz],
+			 [-s * wz + c * xy, 1.0 - c * (xx + zz), s * wx + c * yz],
+			 [s * wy + c * xz, -s * wx + c * yz, 1.0 - c * (xx + yy)]]
+		self.R = [[E0[0] * R0[k] + E0[1] * R1[k] + E0[2] * R2[k] for k in range(3)] for E0 in E]
+		return
+
+	def getEulerAngles(self):
+		"""
+		Estimated attitude.
+
+		:return: yaw, pitch, roll [rad]
+		"""
+		R = self.R
+		pitch = -math.asin(max(-1.0, min(1.0, R[0][2])))
+		return math.atan2(R[0][1], R[0][0]), pitch, math.atan2(R[1][2], R[2][2])
+
+class PositionVelocityEKF():
+	def __init__(self):
+		"""
+		Kalman filter on [pn, pe, pd, vn, ve, vd] (inertial position and velocity). The inertial acceleration is the input
+		of the prediction, and the GPS position, speed over ground and course over ground are the measurements, the last
+		two being non-linear in the state.
+		"""
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Restarts with no GPS fix.
+		"""
+		self.x = [0.0] * 6
+		self.P = [[0.0] * 6 for row in range(6)]
+		for index in range(3):
+			self.P[index][index] = initialPositionSigma ** 2
+			self.P[index + 3][index + 3] = initialVelocitySigma ** 2
+		self.initialized = False
+		return
+
+	def predict(self, accelNED, dT):
+		"""
+		Propagates the state and covariance with a constant acceleration over dT.
+
+		:param accelNED: inertial acceleration [an, ae, ad] [m/s^2]
+		:param dT: time since the last prediction [s]
+		"""
+		x = self.x
+		P = self.P
+		halfdT2 = 0.5 * dT * dT
+		for index in range(3):
+			x[index] += x[index + 3] * dT + accelNED[index] * halfdT2
+			x[index + 3] += accelNED[index] * dT
+		# P <- F P F^T + Q, F = [[I, dT I], [0, I]], done block-wise
+		for i in range(3):
+			for j in range(3):
+				Pvv = P[i + 3][j + 3]
+				Ppv = P[i][j + 3] + dT * Pvv
+				Pvp = P[i + 3][j] + dT * Pvv
+				P[i][j] += dT * (P[i][j + 3] + Pvp)
+				P[i][j + 3] = Ppv
+				P[i + 3][j] = Pvp
+		variance = accelProcessSigma ** 2
+		for index in range(3):
+			P[index][index] += variance * halfdT2 * halfdT2
+			P[index][index + 3] += variance * halfdT2 * dT
+			P[index + 3][index] += variance * halfdT2 * dT
+			P[index + 3][index + 3] += variance * dT * dT
+		return
+
+	def scalarUpdate(self, residual, H, variance):
+		"""
+		Sequential measurement update with one scalar measurement.
+
+		:param residual: measurement minus its prediction
+		:param H: sparse measurement row as a list of (state index, derivative)
+		:param variance: measurement noise variance
+		"""
+		P = self.P
+		PHt = [sum(row[k] * h for k, h in H) for row in P]
+		S = sum(PHt[k] * h for k, h in H) + variance
+		K = [value / S for value in PHt]
+		x = self.x
+		for i in range(6):
+			x[i] += K[i] * residual
+			Ki = K[i]
+			Pi = P[i]
+			for j in range(6):
+				Pi[j] -= Ki * PHt[j]
+		return
+
+	def updateGPS(self, sensors):
+		"""
+		Measurement update with a new GPS fix. The first fix initializes the position and velocity directly.
+
+		:param sensors: vehicleSensors (noisy)
+		"""
+		sog, cog = sensors.gps_sog, sensors.gps_cog
+		if not self.initialized:
+			self.x = [sensors.gps_n, sensors.gps_e, -sensors.gps_alt, sog * math.cos(cog), sog * math.sin(cog), 0.0]
+			self.initialized = True
+			return
+		x = self.x
+		horizontal = VSC.GPS_sigmaHorizontal ** 2 + VSC.GPS_etaHorizontal ** 2
+		self.scalarUpdate(sensors.gps_n - x[0], [(0, 1.0)], horizontal)
+		self.scalarUpdate(sensors.gps_e - x[1], [(1, 1.0)], horizontal)
+		self.scalarUpdate(-sensors.gps_alt - x[2], [(2, 1.0)], VSC.GPS_sigmaVertical ** 2 + VSC.GPS_etaVertical ** 2)
+		vn, ve = x[3], x[4]
+		speed = math.hypot(vn, ve)
+		if speed > minimumCourseSpeed:
+			self.scalarUpdate(sog - speed, [(3, vn / speed), (4, ve / speed)], VSC.GPS_sigmaSOG ** 2)
+			vn, ve = x[3], x[4]
+			speed = math.hypot(vn, ve)
+			if sog > minimumCourseSpeed and speed > minimumCourseSpeed:
+				residual = math.remainder(cog - math.atan2(ve, vn), 2.0 * math.pi)
+				cogSigma = VSC.GPS_sigmaCOG * VPC.InitialSpeed / sog
+				self.scalarUpdate(residual, [(3, -ve / speed ** 2), (4, vn / speed ** 2)], cogSigma ** 2)
+		return
+
+class VehicleEstimator():
+	def __init__(self, dT=VPC.dT, attitudeRate=100.0, positionRate=100.0):
+		"""
+		Estimation stage fed with the noisy sensors once per simulation step. The attitude filter and the position
+		prediction run at their own rates (decimated from the step rate), and a GPS measurement update is made whenever a
+		new GPS fix appears in the sensors.
+
+		:param dT: simulation time step [s]
+		:param attitudeRate: attitude filter rate [Hz]
+		:param positionRate: position/velocity prediction rate [Hz]
+		"""
+		self.dT = dT
+		self.attitudeSteps = max(1, round(1.0 / (attitudeRate * dT)))
+		self.positionSteps = max(1, round(1.0 / (positionRate * dT)))
+		self.attitudeFilter = ComplementaryAttitudeFilter()
+		self.positionFilter = PositionVelocityEKF()
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Restarts both filters.
+		"""
+		self.attitudeFilter.reset()
+		self.positionFilter.reset()
+		self.stepCount = 0
+		self.lastGps = None
+		self.pitot = 0.0
+		self.estimatedState = None
+		return
+
+	def update(self, sensors):
+		"""
+		Runs the filters that are due at this step.
+
+		:param sensors: vehicleSensors (noisy)
+		"""
+		if self.stepCount % self.attitudeSteps == 0:
+			self.attitudeFilter.update(sensors, self.attitudeSteps * self.dT)
+		if self.stepCount % self.positionSteps == 0:
+			R = self.attitudeFilter.R
+			ax, ay, az = sensors.accel_x, sensors.accel_y, sensors.accel_z
+			accelNED = [R[0][k] * ax + R[1][k] * ay + R[2][k] * az for k in range(3)]  # R transpose, body to inertial
+			accelNED[2] += VPC.g0
+			self.positionFilter.predict(accelNED, self.positionSteps * self.dT)
+		gps = (sensors.gps_n, sensors.gps_e, sensors.gps_alt, sensors.gps_sog, sensors.gps_cog)
+		if gps != self.lastGps:
+			self.positionFilter.updateGPS(sensors)
+			self.lastGps = gps
+		self.pitot = sensors.pitot
+		self.stepCount += 1
+		self.estimatedState = None
+		return
+
+	def getEstimatedState(self):
+		"""
+		Current estimate as a vehicleState, with the velocity rotated into the body frame and the airspeed taken from the
+		pitot tube (the velocity estimate is relative to the ground, not the air). Built on demand and kept until the next
+		update.
+
+		:return: vehicleState
+		"""
+		if self.estimatedState is None:
+			yaw, pitch, roll = self.attitudeFilter.getEulerAngles()
+			R = self.attitudeFilter.R
+			pn, pe, pd, vn, ve, vd = self.positionFilter.x
+			u, v, w = [row[0] * vn + row[1] * ve + row[2] * vd for row in R]
+			p, q, r = self.attitudeFilter.rates
+			self.estimatedState = States.vehicleState(pn, pe, pd, u, v, w, yaw, pitch, roll, p, q, r)
+			self.estimatedState.Va = math.sqrt(2.0 * max(self.pitot, 0.0) / VPC.rho)
+		return self.estimatedState
@@ -2,10 +2,18 @@
 Holds the vehicle graphics, only operation on it is to return a set of points and meshes with the appropriate rotation/translation
 currently just returns the modified points, does not update the base ones. Module uses its baseUnit variable to scale the model to an
 arbitrary size for good rendering in the display window.
+
+getNewPointsArray is a NumPy version of getNewPoints the display can opt into: the vertices are also kept as a contiguous
+array and the rotation, NED to ENU conversion, translation and scaling are done in a single matrix product, optionally
+written into a reused output buffer and for many poses at once. getModelMatrix gives the same mapping as a 4x4 homogeneous
+matrix, so that the display can leave the vertices alone and apply the transform on the graphics card instead.
 """
 
+import numpy
+
 from ..Utilities import MatrixMath as mm
 from ..Utilities import Rotations
+from ..Utilities import ArrayRotations
 from ..Constants import VehiclePhysicalConstants as VPC
 
 baseUnit = 1.0
@@ -116,6 +124,7 @@ class VehicleGeometry():
 					   green, green, green, green,
 					   blue]
 
+		self.verticesArray = numpy.array(self.vertices, dtype=float)	# [n x 3] contiguous copy for getNewPointsArray
 		return
 
 	def getNewPoints(self, x, y, z, yaw, pitch, roll):
@@ -136,3 +145,55 @@ class VehicleGeometry():
 		#student code goes here
 
 		return newPoints
+
+	def getNewPointsArray(self, x, y, z, yaw, pitch, roll, scale=1.0, out=None):
+		"""
+		Array version of getNewPoints, computed from self.verticesArray. Every vertex v (as a row) is mapped to
+		scale*((v R + p_NED) M) where R is the inertial to body DCM and M swaps north/east and flips down to up; the
+		rotation, axis swap and scale are folded into one 3x3 matrix so the whole mesh takes a single matrix product.
+
+		The pose arguments may also be arrays of the same shape [...] to transform the mesh for many poses at once.
+
+		:param x: North Displacement (Pn) in [m]
+		:param y: East Displacement (Pe) in [m]
+		:param z: Down Displacement (Pd) in [m]
+		:param yaw: rotation about inertial down [rad]
+		:param pitch: rotation about intermediate y-axis [rad]
+		:param roll: rotation about body x-axis [rad]
+		:param scale: scaling applied to the final points
+		:param out: optional array [... x n x 3] to write the points into, reused between calls to avoid allocation
+		:return: numpy array [... x n x 3] of points in inertial EAST-NORTH-UP frame (for plotting)
+		"""
+		transform = self._enuTransform(yaw, pitch, roll, scale)
+		offset = scale*numpy.stack(numpy.broadcast_arrays(y, x, numpy.negative(z)), axis=-1)
+		out = numpy.matmul(self.verticesArray, transform, out=out)
+		out += offset[..., numpy.newaxis, :]
+		return out
+
+	def getModelMatrix(self, x, y, z, yaw, pitch, roll, scale=1.0):
+		"""
+		4x4 homogeneous model matrix that takes a vertex of self.vertices (as a column [x, y, z, 1]) to the same point in
+		inertial EAST-NORTH-UP as getNewPointsArray. Pose arguments may be arrays of the same shape [...].
+
+		:return: numpy array [... x 4 x 4]
+		"""
+		transform = self._enuTransform(yaw, pitch, roll, scale)
+		modelMatrix = numpy.zeros(transform.shape[:-2] + (4, 4))
+		modelMatrix[..., :3, :3] = numpy.swapaxes(transform, -1, -2)
+		modelMatrix[..., :3, 3] = scale*numpy.stack(numpy.broadcast_arrays(y, x, numpy.negative(z)), axis=-1)
+		modelMatrix[..., 3, 3] = 1.0
+		return modelMatrix
+
+	@staticmethod
+	def _enuTransform(yaw, pitch, roll, scale):
+		"""
+		Matrix T [... x 3 x 3] such that a body frame vertex v as a row maps to v T in scaled inertial ENU axes.
+		"""
+		yaw, pitch, roll = numpy.broadcast_arrays(numpy.asarray(yaw, dtype=float), numpy.asarray(pitch, dtype=float),
+												  numpy.asarray(roll, dtype=float))
+		R = ArrayRotations.euler2DCM(yaw, pitch, roll)
+		transform = numpy.empty(R.shape)
+		transform[..., 0] = scale*R[..., 1]		# east
+		transform[..., 1] = scale*R[..., 0]		# north
+		transform[..., 2] = -scale*R[..., 2]	# up
+		return transform
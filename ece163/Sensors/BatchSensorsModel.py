@@ -0,0 +1,247 @@
+"""
+Vectorized (NumPy) version of the sensor model in SensorsModel. Rather than one vehicle and one time step at a time, the
+true sensor values are computed for arrays of states and state derivatives, and the biases, Gauss-Markov drifts and white
+noise of the sensors are generated for whole batches of vehicles and time steps at once. This is used for estimator Monte
+Carlo studies, not for the normal time step simulation.
+
+States and derivatives use the ordering of stateNames ([pn, pe, pd, u, v, w, yaw, pitch, roll, p, q, r] along the last
+axis), and sensor values are packed along the last axis in the order of sensorNames, which are the members of
+vehicleSensors.
+"""
+
+import math
+import numpy
+
+from ..Containers import Sensors
+from ..Constants import VehiclePhysicalConstants as VPC
+from ..Constants import VehicleSensorConstants as VSC
+from ..Utilities import ArrayRotations
+from ..Utilities import RandomStreams
+
+stateNames = ['pn', 'pe', 'pd', 'u', 'v', 'w', 'yaw', 'pitch', 'roll', 'p', 'q', 'r']
+
+sensorNames = ['gyro_x', 'gyro_y', 'gyro_z', 'accel_x', 'accel_y', 'accel_z', 'mag_x', 'mag_y', 'mag_z', 'baro', 'pitot',
+			   'gps_n', 'gps_e', 'gps_alt', 'gps_sog', 'gps_cog']
+
+sensorIndex = {name: index for index, name in enumerate(sensorNames)}
+
+gyroSlice = slice(0, 3)
+accelSlice = slice(3, 6)
+magSlice = slice(6, 9)
+gpsPositionSlice = slice(11, 14)
+gpsSlice = slice(11, 16)
+
+magfield = numpy.array(VSC.magfield).reshape(3)
+
+def sensorsToArray(sensors):
+	"""
+	Packs a sequence of vehicleSensors instances into an [n x 16] array.
+
+	:param sensors: iterable of vehicleSensors
+	:return: numpy array [n x 16]
+	"""
+	return numpy.array([[getattr(sensor, name) for name in sensorNames] for sensor in sensors], dtype=float)
+
+def arrayToSensors(s):
+	"""
+	Unpacks a single row of 16 sensor values into a vehicleSensors instance.
+
+	:param s: array-like of length 16
+	:return: vehicleSensors
+	"""
+	sensors = Sensors.vehicleSensors()
+	for index, name in enumerate(sensorNames):
+		setattr(sensors, name, float(s[index]))
+	return sensors
+
+def trueSensors(x, dot, Va=None):
+	"""
+	Noise free sensor values for arrays of states, same models as SensorsModel: body rates for the gyros, specific force
+	for the accelerometers, the earth magnetic field rotated into the body frame, static and dynamic pressure, and
+	position, speed and course over ground for the GPS.
+
+	:param x: state array [... x 12]
+	:param dot: state derivative array [... x 12], derivatives of the states in the same order
+	:param Va: optional airspeed array [...] for the pitot tube, computed from the body velocities (no wind) if None
+	:return: sensor array [... x 16]
+	"""
+	x = numpy.asarray(x, dtype=float)
+	dot = numpy.asarray(dot, dtype=float)
+	u, v, w = x[..., 3], x[..., 4], x[..., 5]
+	yaw, pitch, roll = x[..., 6], x[..., 7], x[..., 8]
+	p, q, r = x[..., 9], x[..., 10], x[..., 11]
+	if Va is None:
+		Va = numpy.sqrt(u ** 2 + v ** 2 + w ** 2)
+
+	s = numpy.empty(x.shape[:-1] + (len(sensorNames),))
+	s[..., gyroSlice] = x[..., 9:12]
+
+	cTheta = numpy.cos(pitch)
+	s[..., 3] = dot[..., 3] + q * w - r * v + VPC.g0 * numpy.sin(pitch)
+	s[..., 4] = dot[..., 4] + r * u - p * w - VPC.g0 * cTheta * numpy.sin(roll)
+	s[..., 5] = dot[..., 5] + p * v - q * u - VPC.g0 * cTheta * numpy.cos(roll)
+
+	s[..., magSlice] = ArrayRotations.euler2DCM(yaw, pitch, roll) @ magfield
+
+	s[..., 9] = VPC.rho * VPC.g0 * x[..., 2] + VSC.Pground
+	s[..., 10] = 0.5 * VPC.rho * numpy.asarray(Va) ** 2
+
+	s[..., 11] = x[..., 0]
+	s[..., 12] = x[..., 1]
+	s[..., 13] = -x[..., 2]
+	s[..., 14] = numpy.hypot(dot[..., 0], dot[..., 1])
+	s[..., 15] = numpy.arctan2(dot[..., 1], dot[..., 0])
+	return s
+
+def gaussMarkovSequence(initial, steps, dT, tau, eta, generator):
+	"""
+	Propagates a batch of independent first order Gauss-Markov processes, v[k+1] = exp(-dT/tau) v[k] + eta w[k] with w
+	unit Gaussian, the same discretization as the scalar model in SensorsModel.
+
+	:param initial: array [...] of the process values before the first step
+	:param steps: number of steps
+	:param dT: time step [s]
+	:param tau: time constant [s]
+	:param eta: standard deviation of the driving noise, or an array broadcasting against initial
+	:param generator: numpy.random.Generator
+	:return: array [steps x ...] of the process after each step
+	"""
+	decay = math.exp(-dT / tau)
+	values = eta * generator.standard_normal((steps,) + numpy.shape(initial))
+	previous = numpy.asarray(initial, dtype=float)
+	for step in range(steps):
+		values[step] += decay * previous
+		previous = values[step]
+	return values
+
+class BatchSensorsModel():
+	def __init__(self, count=1, dT=VPC.dT, gpsUpdateHz=VSC.GPS_rate, rng=None):
+		"""
+		Sensor noise for a batch of vehicles: each vehicle has its own turn-on biases, gyro and GPS Gauss-Markov drifts,
+		and white noise, with the GPS updated at gpsUpdateHz and held in between like SensorsModel.
+
+		:param count: number of vehicles
+		:param dT: time step [s]
+		:param gpsUpdateHz: GPS update rate [Hz]
+		:param rng: RandomStream (see Utilities.RandomStreams) or numpy.random.Generator, the 'sensors' stream of a freshly
+			seeded RandomStreams if None
+		"""
+		self.count = count
+		self.dT = dT
+		self.gpsUpdateHz = gpsUpdateHz
+		self.gpsSteps = max(1, round(1.0 / (gpsUpdateHz * dT)))
+		if rng is None:
+			rng = RandomStreams.RandomStreams().stream('sensors')
+		self.generator = getattr(rng, 'generator', rng)
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Draws new biases and restarts the Gauss-Markov processes and the GPS update counter.
+		"""
+		self.initializeBiases()
+		self.gyroMarkov = numpy.zeros((self.count, 3))
+		self.gpsMarkov = numpy.zeros((self.count, 3))
+		self.gpsCounter = 0
+		self.lastGps = numpy.zeros((self.count, 5))
+		self.sensorsTrue = numpy.zeros((self.count, len(sensorNames)))
+		self.sensorsNoisy = numpy.zeros((self.count, len(sensorNames)))
+		return
+
+	def initializeBiases(self):
+		"""
+		Draws the turn-on biases of every vehicle, uniform within the bias limits of VehicleSensorConstants.
+		"""
+		limits = numpy.zeros(len(sensorNames))
+		limits[gyroSlice] = VSC.gyro_bias
+		limits[accelSlice] = VSC.accel_bias
+		limits[magSlice] = VSC.mag_bias
+		limits[sensorIndex['baro']] = VSC.baro_bias
+		limits[sensorIndex['pitot']] = VSC.pitot_bias
+		self.biases = limits * self.generator.uniform(-1.0, 1.0, (self.count, len(sensorNames)))
+		return
+
+	def simulate(self, x, dot, Va=None):
+		"""
+		Noisy sensor values over a sequence of time steps, continuing the noise processes from the previous call.
+
+		:param x: state array [steps x count x 12]
+		:param dot: state derivative array [steps x count x 12]
+		:param Va: optional airspeed array [steps x count], see trueSensors
+		:return: noisy sensor array [steps x count x 16]
+		"""
+		return self.corrupt(trueSensors(x, dot, Va))
+
+	def corrupt(self, true):
+		"""
+		Adds the biases and noise of every vehicle to true sensor values over a sequence of time steps, continuing the noise
+		processes from the previous call. The same true values can be shared by every vehicle by passing [steps x 1 x 16].
+
+		:param true: true sensor array [steps x count x 16] (or broadcasting to it)
+		:return: noisy sensor array [steps x count x 16]
+		"""
+		steps = true.shape[0]
+		shape = (steps, self.count, len(sensorNames))
+		generator = self.generator
+
+		sigmas = numpy.zeros(len(sensorNames))
+		sigmas[gyroSlice] = VSC.gyro_sigma
+		sigmas[accelSlice] = VSC.accel_sigma
+		sigmas[magSlice] = VSC.mag_sigma
+		sigmas[sensorIndex['baro']] = VSC.baro_sigma
+		sigmas[sensorIndex['pitot']] = VSC.pitot_sigma
+		noisy = true + self.biases + sigmas * generator.standard_normal(shape)
+
+		gyroMarkov = gaussMarkovSequence(self.gyroMarkov, steps, self.dT, VSC.gyro_tau, VSC.gyro_eta, generator)
+		noisy[..., gyroSlice] += gyroMarkov
+		self.gyroMarkov = gyroMarkov[-1]
+
+		# the GPS is only measured every gpsSteps steps, with its Gauss-Markov drift advancing once per measurement
+		counters = (self.gpsCounter + numpy.arange(steps)) % self.gpsSteps
+		ticks = numpy.flatnonzero(counters == 0)
+		gps = self.lastGps[numpy.newaxis].repeat(len(ticks) + 1, axis=0)
+		if len(ticks):
+			etas = numpy.array([VSC.GPS_etaHorizontal, VSC.GPS_etaHorizontal, VSC.GPS_etaVertical])
+			gpsMarkov = gaussMarkovSequence(self.gpsMarkov, len(ticks), 1.0 / self.gpsUpdateHz, VSC.GPS_tau, etas, generator)
+			self.gpsMarkov = gpsMarkov[-1]
+			trueGps = numpy.broadcast_to(true[ticks][..., gpsSlice], (len(ticks), self.count, 5))
+			gpsSigmas = numpy.array([VSC.GPS_sigmaHorizontal, VSC.GPS_sigmaHorizontal, VSC.GPS_sigmaVertical,
+									 VSC.GPS_sigmaSOG])
+			gps[1:, :, 0:4] = trueGps[..., 0:4] + gpsSigmas * generator.standard_normal(trueGps.shape[:-1] + (4,))
+			gps[1:, :, 0:3] += gpsMarkov
+			with numpy.errstate(divide='ignore'):
+				cogSigma = numpy.where(trueGps[..., 3] > 0.0, VSC.GPS_sigmaCOG * VPC.InitialSpeed / trueGps[..., 3], 0.0)
+			gps[1:, :, 4] = trueGps[..., 4] + cogSigma * generator.standard_normal(cogSigma.shape)
+			self.lastGps = gps[-1]
+		held = numpy.searchsorted(ticks, numpy.arange(steps), side='right')  # index into gps of the latest measurement
+		noisy[..., gpsSlice] = gps[held]
+		self.gpsCounter = (self.gpsCounter + steps) % self.gpsSteps
+
+		self.sensorsTrue = numpy.broadcast_to(true[-1], shape[1:])
+		self.sensorsNoisy = noisy[-1]
+		return noisy
+
+	def update(self, x, dot, Va=None):
+		"""
+		Noisy sensor values for one time step of every vehicle.
+
+		:param x: state array [count x 12]
+		:param dot: state derivative array [count x 12]
+		:param Va: optional airspeed array [count]
+		:return: noisy sensor array [count x 16]
+		"""
+		return self.simulate(numpy.asarray(x)[numpy.newaxis], numpy.asarray(dot)[numpy.newaxis],
+							 None if Va is None else numpy.asarray(Va)[numpy.newaxis])[0]
+
+	def getSensorsNoisy(self, vehicle=0):
+		"""
+		Noisy sensors of one vehicle from the last step, as a vehicleSensors instance.
+		"""
+		return arrayToSensors(self.sensorsNoisy[vehicle])
+
+	def getSensorsTrue(self, vehicle=0):
+		"""
+		True sensors of one vehicle from the last step, as a vehicleSensors instance.
+		"""
+		return arrayToSensors(self.sensorsTrue[vehicle])
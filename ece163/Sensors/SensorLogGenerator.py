@@ -0,0 +1,140 @@
+"""
+Generates noisy sensor logs offline from a recorded flight, for estimator development without re-running the closed loop
+simulation. The state log exported by Simulate (exportToCSV or exportToPickle) is read, the state derivatives needed by
+the accelerometers and GPS are taken numerically from the recorded states, the true sensor values are computed once for
+the whole flight and then any number of independent noise realisations (biases, Gauss-Markov drifts, white noise, GPS
+sample and hold) are generated in one vectorized pass with BatchSensorsModel.
+
+The output is a columnar NumPy .npz file with one array per column: 'time' [steps], 'true.<sensor>' [steps] and
+'<sensor>' [realisations x steps] for every member of vehicleSensors, plus the 'seed' the noise was generated from. The
+seed is stored as a decimal string, since a fresh seed is wider than any NumPy integer; readSensorLog reads it back.
+
+Run from the repository root with: python -m ece163.Sensors.SensorLogGenerator flight.csv sensors.npz -n 100
+"""
+
+import argparse
+import csv
+import pickle
+
+import numpy
+
+from ..Constants import VehiclePhysicalConstants as VPC
+from ..Utilities import RandomStreams
+from . import BatchSensorsModel
+
+def loadStateLog(filename):
+	"""
+	Reads a log written by Simulate.exportToCSV or Simulate.exportToPickle (chosen by the file extension).
+
+	:param filename: path of a .csv or .pickle file
+	:return: list of column names, numpy array [steps x columns]
+	"""
+	if filename.lower().endswith('.csv'):
+		with open(filename, newline='') as csvFile:
+			header = next(csv.reader(csvFile))
+			data = numpy.loadtxt(csvFile, delimiter=',', ndmin=2)
+	else:
+		with open(filename, 'rb') as f:
+			header, takenData = pickle.load(f)
+		data = numpy.array(takenData, dtype=float, ndmin=2)
+	return list(header), data
+
+def statesFromLog(header, data, prefix='state'):
+	"""
+	Extracts the time and the vehicle states from a log.
+
+	:param header: list of column names
+	:param data: array [steps x columns]
+	:param prefix: name the states were recorded under in the Simulate variableList
+	:return: time [steps], state array [steps x 12] (BatchSensorsModel.stateNames ordering), airspeed [steps] or None if the log
+		has no airspeed column
+	"""
+	columns = {name: index for index, name in enumerate(header)}
+	missing = [name for name in BatchSensorsModel.stateNames if '{}.{}'.format(prefix, name) not in columns]
+	if missing:
+		raise ValueError('State log is missing columns {}'.format(', '.join('{}.{}'.format(prefix, name) for name in missing)))
+	x = data[:, [columns['{}.{}'.format(prefix, name)] for name in BatchSensorsModel.stateNames]]
+	VaColumn = columns.get('{}.Va'.format(prefix))
+	Va = data[:, VaColumn] if VaColumn is not None else None
+	return data[:, columns['time']], x, Va
+
+def stateDerivatives(time, x):
+	"""
+	Numerical state derivatives of a recorded flight (second order central differences), enough for the sensor models:
+	only the position and body velocity rates are used.
+
+	:param time: time [steps]
+	:param x: state array [steps x 12]
+	:return: derivative array [steps x 12]
+	"""
+	dot = numpy.zeros_like(x)
+	dot[:, 0:6] = numpy.gradient(x[:, 0:6], time, axis=0)
+	return dot
+
+def generateSensorLogs(time, x, realizations=1, seed=None, Va=None):
+	"""
+	True sensor values of a recorded flight and independent noisy realisations of them.
+
+	:param time: time [steps], evenly spaced
+	:param x: state array [steps x 12]
+	:param realizations: number of noise realisations
+	:param seed: seed of the noise, a fresh one if None
+	:param Va: optional airspeed [steps] for the pitot tube, computed from the body velocities if None
+	:return: true sensors [steps x 16], noisy sensors [realizations x steps x 16], seed used
+	"""
+	streams = RandomStreams.RandomStreams(seed)
+	dT = float(numpy.median(numpy.diff(time))) if len(time) > 1 else VPC.dT
+	true = BatchSensorsModel.trueSensors(x, stateDerivatives(time, x), Va)
+	model = BatchSensorsModel.BatchSensorsModel(realizations, dT, rng=streams.stream('sensors'))
+	noisy = model.corrupt(true[:, numpy.newaxis, :])
+	return true, noisy.transpose(1, 0, 2), streams.seed
+
+def writeSensorLog(filename, time, true, noisy, seed=None, compressed=False):
+	"""
+	Writes sensor logs as a columnar .npz file, see the module description for the layout.
+
+	:param filename: valid file path to write to
+	:param time: time [steps]
+	:param true: true sensors [steps x 16]
+	:param noisy: noisy sensors [realizations x steps x 16]
+	:param seed: seed of the noise, stored along with the data
+	:param compressed: use zip compression (smaller, slower)
+	"""
+	columns = {'time': numpy.asarray(time)}
+	for index, name in enumerate(BatchSensorsModel.sensorNames):
+		columns['true.{}'.format(name)] = true[:, index]
+		columns[name] = noisy[..., index]
+	if seed is not None:
+		columns['seed'] = numpy.asarray(str(int(seed)))
+	(numpy.savez_compressed if compressed else numpy.savez)(filename, **columns)
+	return
+
+def readSensorLog(filename):
+	"""
+	Reads a sensor log written by writeSensorLog.
+
+	:param filename: path of the .npz file
+	:return: time [steps], true sensors [steps x 16], noisy sensors [realizations x steps x 16], seed (int, None if the
+		file has none)
+	"""
+	with numpy.load(filename) as columns:
+		time = columns['time']
+		true = numpy.stack([columns['true.{}'.format(name)] for name in BatchSensorsModel.sensorNames], axis=-1)
+		noisy = numpy.stack([columns[name] for name in BatchSensorsModel.sensorNames], axis=-1)
+		seed = int(str(columns['seed'])) if 'seed' in columns else None
+	return time, true, noisy, seed
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Generates noisy sensor logs from a state log exported by Simulate')
+	parser.add_argument('stateLog', help='.csv or .pickle file from exportToCSV/exportToPickle')
+	parser.add_argument('output', help='.npz file to write')
+	parser.add_argument('-n', '--realizations', type=int, default=1, help='number of noise realisations')
+	parser.add_argument('--seed', type=int, default=None, help='seed of the noise, random if not given')
+	parser.add_argument('--prefix', default='state', help='name the states were recorded under')
+	parser.add_argument('--compressed', action='store_true', help='compress the output file')
+	arguments = parser.parse_args()
+
+	time, x, Va = statesFromLog(*loadStateLog(arguments.stateLog), prefix=arguments.prefix)
+	true, noisy, seed = generateSensorLogs(time, x, arguments.realizations, arguments.seed, Va)
+	writeSensorLog(arguments.output, time, true, noisy, seed, arguments.compressed)
+	print('{} realisations of {} steps written to {} (seed {})'.format(arguments.realizations, len(time), arguments.output, seed))
@@ -24,4 +24,5 @@ class Chapter3Simulate(Simulate.Simulate):
 	def reset(self):
 		self.time = 0
 		self.underlyingModel.reset()
-		self.takenData.clear()
\ No newline at end of file
+		self.takenData.clear()
+		self.resetEvents()
\ No newline at end of file
@@ -14,6 +14,7 @@ class Chapter4Simulate(Simulate.Simulate):
 		self.variableList.append((self.underlyingModel.getVehicleState, 'state',
 									['pn', 'pe', 'pd', 'yaw', 'pitch', 'roll', 'u', 'v', 'w', 'p', 'q', 'r', 'Va', 'alpha', 'beta']))
 		# self.dT = 1/50
+		self.attachRandomStreams()
 
 
 	def getVehicleState(self):
@@ -28,4 +29,6 @@ class Chapter4Simulate(Simulate.Simulate):
 	def reset(self):
 		self.time = 0
 		self.underlyingModel.reset()
-		self.takenData.clear()
\ No newline at end of file
+		self.takenData.clear()
+		self.resetEvents()
+		self.resetRandomStreams()
\ No newline at end of file
@@ -17,6 +17,7 @@ class Chapter5Simulate(Simulate.Simulate):
 		# self.dT = 1/50
 
 		self.controlInput = controlInputs()
+		self.attachRandomStreams()
 
 	def getVehicleState(self):
 		return self.underlyingModel.getVehicleState()
@@ -32,4 +33,6 @@ class Chapter5Simulate(Simulate.Simulate):
 	def reset(self):
 		self.time = 0
 		self.underlyingModel.reset()
-		self.takenData.clear()
\ No newline at end of file
+		self.takenData.clear()
+		self.resetEvents()
+		self.resetRandomStreams()
\ No newline at end of file
@@ -18,6 +18,7 @@ class Chapter6Simulate(Simulate.Simulate):
 		# self.dT = 1/50
 
 		self.referenceInput = referenceCommands()
+		self.attachRandomStreams()
 
 	def getVehicleState(self):
 		return self.underlyingModel.getVehicleState()
@@ -26,6 +27,8 @@ class Chapter6Simulate(Simulate.Simulate):
 		self.time += VehiclePhysicalConstants.dT
 		if referenceInput is None:
 			referenceInput = self.referenceInput
+		if self.gainSchedule is not None:
+			self.gainSchedule.scheduleGains(self.underlyingModel)
 		self.underlyingModel.Update(referenceInput)
 		self.recordData([referenceInput.commandedCourse, referenceInput.commandedAltitude, referenceInput.commandedAirspeed])
 		return
@@ -33,4 +36,6 @@ class Chapter6Simulate(Simulate.Simulate):
 	def reset(self):
 		self.time = 0
 		self.underlyingModel.reset()
-		self.takenData.clear()
\ No newline at end of file
+		self.takenData.clear()
+		self.resetEvents()
+		self.resetRandomStreams()
\ No newline at end of file
@@ -20,20 +20,101 @@ class Chapter7Simulate(Simulate.Simulate):
 		# self.dT = 1/50
 
 		self.referenceInput = referenceCommands()
+		self.estimator = None	# optional state estimator fed with the noisy sensors every step, see setEstimator
+		self.controlFromEstimate = False	# autopilot uses the estimated rather than the true state, see setControlFromEstimate
+		self.controlSteps = 1	# steps between autopilot updates when controlling from the estimate
+		self.controlStepCount = 0
+		self.heldControls = None	# control surfaces held between autopilot updates
+		self.attachRandomStreams()
 
 	def getVehicleState(self):
 		return self.underlyingModel.getVehicleState()
 
+	def getControlSurfaces(self):
+		"""
+		Control surfaces the vehicle is flying: the ones held from the last autopilot update when controlling from the
+		estimate, otherwise the ones stored by the closed loop control.
+
+		:return: controlInputs
+		"""
+		if self.controlFromEstimate and self.heldControls is not None:
+			return self.heldControls
+		return self.underlyingModel.getVehicleControlSurfaces()
+
+	def setEstimator(self, estimator=None):
+		"""
+		Sets (or clears with None) the state estimation stage. The estimator is given the noisy sensors after every step
+		and runs its filters at their own rates (see VehicleEstimator); its estimate is recorded as 'estimate' alongside
+		the true state.
+
+		:param estimator: VehicleEstimator instance (or any object with update(sensors), reset() and getEstimatedState())
+			or None
+		"""
+		self.estimator = estimator
+		if estimator is None:
+			self.controlFromEstimate = False
+		self.variableList[:] = [entry for entry in self.variableList if entry[1] != 'estimate']
+		if estimator is not None:
+			self.variableList.append((self.getEstimatedState, 'estimate',
+									  ['pn', 'pe', 'pd', 'yaw', 'pitch', 'roll', 'u', 'v', 'w', 'p', 'q', 'r']))
+		return
+
+	def getEstimatedState(self):
+		return self.estimator.getEstimatedState()
+
+	def setControlFromEstimate(self, enabled=True, controlRate=None):
+		"""
+		Makes the autopilot use the estimate of the estimation stage instead of the true state. The control commands are
+		then computed at controlRate from the latest estimate (made from the sensors of the previous step) and held
+		between updates, while the vehicle itself is still integrated every step.
+
+		The commands come from VehicleClosedLoopControl.UpdateControlCommands(referenceCommands, estimate) and are applied
+		through the aerodynamics model's Update, so the surfaces stored by the closed loop control are not the ones flown;
+		read them with getControlSurfaces instead. A gain schedule is looked up from the estimate as well.
+
+		:param enabled: True to control from the estimate, False to go back to the true state
+		:param controlRate: autopilot rate [Hz], every step if None
+		"""
+		if enabled and self.estimator is None:
+			raise ValueError('An estimator must be set before controlling from the estimate')
+		self.controlFromEstimate = enabled
+		if controlRate is None:
+			self.controlSteps = 1
+		else:
+			self.controlSteps = max(1, round(1.0 / (controlRate * VehiclePhysicalConstants.dT)))
+		self.controlStepCount = 0
+		self.heldControls = None
+		return
+
 	def takeStep(self, referenceInput=None):
 		self.time += VehiclePhysicalConstants.dT
 		if referenceInput is None:
 			referenceInput = self.referenceInput
-		self.underlyingModel.Update(referenceInput)
+		if self.controlFromEstimate:
+			if self.heldControls is None or self.controlStepCount % self.controlSteps == 0:
+				estimate = self.estimator.getEstimatedState()
+				if self.gainSchedule is not None:
+					self.gainSchedule.scheduleGains(self.underlyingModel, estimate)
+				self.heldControls = self.underlyingModel.UpdateControlCommands(referenceInput, estimate)
+			self.controlStepCount += 1
+			self.underlyingModel.getVehicleAerodynamicsModel().Update(self.heldControls)
+		else:
+			if self.gainSchedule is not None:
+				self.gainSchedule.scheduleGains(self.underlyingModel)
+			self.underlyingModel.Update(referenceInput)
 		self.sensorModel.update()
+		if self.estimator is not None:
+			self.estimator.update(self.sensorModel.getSensorsNoisy())
 		self.recordData([referenceInput.commandedCourse, referenceInput.commandedAltitude, referenceInput.commandedAirspeed])
 		return
 
 	def reset(self):
 		self.time = 0
 		self.underlyingModel.reset()
-		self.takenData.clear()
\ No newline at end of file
+		self.takenData.clear()
+		self.resetEvents()
+		self.resetRandomStreams()
+		if self.estimator is not None:
+			self.estimator.reset()
+		self.controlStepCount = 0
+		self.heldControls = None
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Automatic tuning of the successive loop closure autopilot. Rather than adjusting the natural frequencies and damping ratios
+in controlTuning by hand, a simple evolution strategy searches over them: each generation perturbs the best tuning found so
+far, turns every candidate into controlGains with VehicleControlGains.computeGains, and flies all of them at once through
+GainsTest in parallel worker processes (or one after the other, when run from the GUI). The candidates are ranked by GainsTest.trackingCost on a step response. Runs that
+are already worse than the current best by abortRatio are stopped early, which saves most of the time spent on bad
+candidates.
+"""
+
+import copy
+import math
+
+import numpy
+
+from ..Containers import Controls
+from ..Controls import VehicleControlGains
+from ..Utilities import RandomStreams
+from . import GainsTest
+
+tuningNames = ['Wn_roll', 'Zeta_roll', 'Wn_course', 'Zeta_course', 'Wn_sideslip', 'Zeta_sideslip', 'Wn_pitch', 'Zeta_pitch',
+			   'Wn_altitude', 'Zeta_altitude', 'Wn_SpeedfromThrottle', 'Zeta_SpeedfromThrottle', 'Wn_SpeedfromElevator',
+			   'Zeta_SpeedfromElevator']
+
+# default step response used for tuning: a turn, a climb and a speed change at the same time
+defaultStepReference = Controls.referenceCommands(math.radians(30.0), 120.0, 28.0)
+
+maxSpread = 1.0		# largest standard deviation of the log of the parameters used while searching
+
+def _tuningFromArray(values):
+	"""
+	Builds a controlTuning from an array of values in the order of tuningNames.
+	"""
+	newTuning = Controls.controlTuning()
+	for name, value in zip(tuningNames, values):
+		setattr(newTuning, name, float(value))
+	return newTuning
+
+def _candidateGains(tuning, linearModel):
+	"""
+	Gains for a candidate tuning, None if the gains cannot be computed (or are not finite) for that tuning.
+	"""
+	try:
+		gains = VehicleControlGains.computeGains(tuning, linearModel)
+	except (ArithmeticError, ValueError):
+		return None
+	if not all(math.isfinite(value) for value in gains.__dict__.values()):
+		return None
+	return gains
+
+def optimizeTuning(initialTuning, linearModel, referenceInput=defaultStepReference, trimControls=None, initialState=None,
+				   numSteps=GainsTest.testNumSteps, populationSize=16, maxGenerations=30, initialSpread=0.3, minSpread=0.01,
+				   abortRatio=3.0, seed=None, processes=None, executor=None):
+	"""
+	Searches for the controlTuning that minimizes the tracking cost of a step response. Parameters are searched in log
+	space (so they stay positive) around the best tuning found so far, and the search spread is widened after a generation
+	that improves and narrowed after one that does not.
+
+	:param initialTuning: controlTuning to start the search from (all parameters must be positive)
+	:param linearModel: Linearized.transferFunctions used to compute the gains of every candidate
+	:param referenceInput: referenceCommands flown by every candidate
+	:param trimControls: trim controlInputs used by the autopilot
+	:param initialState: vehicleState to start every run from
+	:param numSteps: number of simulation steps per run
+	:param populationSize: number of candidates flown per generation
+	:param maxGenerations: maximum number of generations
+	:param initialSpread: initial standard deviation of the log of the parameters
+	:param minSpread: search stops once the spread falls below this
+	:param abortRatio: runs are stopped early once their cost exceeds abortRatio times the current best cost
+	:param seed: seed for the candidate generation (drawn from the 'optimizer' stream of RandomStreams), for repeatable
+		searches
+	:param processes: number of worker processes of GainsTest.sharedProcessPool, defaults to the number of processors, 0
+		to fly the candidates one after the other in the calling thread
+	:param executor: optional executor to fly the candidates on, processes is ignored if given
+	:return: best controlTuning, convergence log (list of dictionaries, one per generation)
+	"""
+	generator = RandomStreams.RandomStreams(seed).stream('optimizer').generator
+	bestValues = numpy.array([getattr(initialTuning, name) for name in tuningNames], dtype=float)
+	if numpy.any(bestValues <= 0.0):
+		raise ValueError('Initial tuning parameters must all be positive')
+	bestTuning = copy.deepcopy(initialTuning)
+	spread = initialSpread
+	convergenceLog = list()
+
+	bestGains = _candidateGains(bestTuning, linearModel)
+	if bestGains is None:
+		raise ArithmeticError('Gains cannot be computed for the initial tuning')
+	recordings, metrics = GainsTest.evaluateGains([bestGains], referenceInput, trimControls, initialState, numSteps,
+												  processes=processes, executor=executor)
+	bestCost = GainsTest.trackingCost(recordings[0])
+	convergenceLog.append({'generation': 0, 'bestCost': bestCost, 'generationBestCost': bestCost,
+						   'medianCost': bestCost, 'spread': spread, 'evaluated': 1, 'aborted': 0, 'invalid': 0})
+
+	for generation in range(1, maxGenerations + 1):
+		if spread < minSpread:
+			break
+		candidateValues = bestValues * numpy.exp(spread * generator.standard_normal((populationSize, len(tuningNames))))
+		candidateTunings = [_tuningFromArray(values) for values in candidateValues]
+		candidateGains = [_candidateGains(tuning, linearModel) for tuning in candidateTunings]
+		validIndices = [index for index, gains in enumerate(candidateGains) if gains is not None]
+
+		abortCost = abortRatio * bestCost if math.isfinite(bestCost) else None
+		recordings, metrics = GainsTest.evaluateGains([candidateGains[index] for index in validIndices], referenceInput,
+													  trimControls, initialState, numSteps, abortCost=abortCost,
+													  processes=processes, executor=executor)
+		costs = numpy.full(populationSize, math.inf)
+		for index, recorded in zip(validIndices, recordings):
+			costs[index] = GainsTest.trackingCost(recorded)
+
+		generationBest = int(numpy.argmin(costs))
+		improved = costs[generationBest] < bestCost
+		if improved:
+			bestCost = float(costs[generationBest])
+			bestValues = candidateValues[generationBest]
+			bestTuning = candidateTunings[generationBest]
+			spread = min(spread * 1.5, maxSpread)
+		else:
+			spread *= 0.6
+
+		convergenceLog.append({'generation': generation, 'bestCost': bestCost,
+							   'generationBestCost': float(costs[generationBest]),
+							   'medianCost': float(numpy.median(costs)), 'spread': spread,
+							   'evaluated': len(validIndices),
+							   'aborted': sum(1 for recorded in recordings if recorded['aborted']),
+							   'invalid': populationSize - len(validIndices)})
+	return bestTuning, convergenceLog
@@ -0,0 +1,203 @@
+"""
+Headless test of a set of autopilot gains. A fresh VehicleClosedLoopControl is flown for a fixed number of steps against a
+set of reference commands and the tracking of each loop is recorded into arrays. Nothing here touches the GUI or any shared
+simulation, so tests can be run in worker processes and many candidate gains can be evaluated in parallel.
+"""
+
+import concurrent.futures
+import copy
+import math
+import multiprocessing
+
+import numpy
+
+from ..Controls import VehicleClosedLoopControl
+from ..Constants import VehiclePhysicalConstants as VPC
+
+testNumSteps = 1000
+
+_sharedPool = None			# long lived worker pool, see sharedProcessPool
+_sharedPoolProcesses = None	# number of workers _sharedPool was created with
+
+recordedNames = ['chi', 'Va', 'altitude', 'cPitch', 'aPitch', 'cRoll', 'aRoll', 'Throttle', 'Aileron', 'Elevator', 'Rudder']
+metricNames = ['rmsCourse', 'rmsAirspeed', 'rmsAltitude', 'rmsPitch', 'rmsRoll']
+
+# errors of this size in each outer loop contribute a cost of one, see trackingCost
+costCourseScale = 10.0		# [deg]
+costAirspeedScale = 1.0		# [m/s]
+costAltitudeScale = 5.0		# [m]
+
+def _wrapDegrees(angle):
+	"""
+	Wraps an angle (or array of angles) in degrees into [-180, 180).
+	"""
+	return (angle + 180.0) % 360.0 - 180.0
+
+def _stepCost(courseError, airspeedError, altitudeError):
+	"""
+	Cost of the tracking errors at one step, errors in degrees, m/s and m.
+	"""
+	return (courseError / costCourseScale) ** 2 + (airspeedError / costAirspeedScale) ** 2 + \
+		   (altitudeError / costAltitudeScale) ** 2
+
+def runGainsTest(gains, referenceInput, trimControls=None, initialState=None, numSteps=testNumSteps, abortCost=None):
+	"""
+	Flies a new closed loop model with the given gains and records the response. Angles are recorded in degrees to match
+	the plots of the gains test, altitude is height above ground [m].
+
+	If abortCost is given, the run stops as soon as its trackingCost is certain to exceed it (the cost only accumulates)
+	or the vehicle state stops being finite; the arrays are then truncated and 'aborted' is set in the recording.
+
+	:param gains: controlGains to test
+	:param referenceInput: referenceCommands to track (copied, the original is not changed)
+	:param trimControls: trim controlInputs used by the autopilot, autopilot default if None
+	:param initialState: vehicleState to start from, the model initial state if None
+	:param numSteps: number of simulation steps to take
+	:param abortCost: optional cost at which the run is abandoned early
+	:return: dictionary with 'time' and one array per name in recordedNames, plus the reference commands used
+	"""
+	model = VehicleClosedLoopControl.VehicleClosedLoopControl()
+	if trimControls is not None:
+		model.setTrimInputs(trimControls)
+	if initialState is not None:
+		model.getVehicleAerodynamicsModel().setVehicleState(copy.deepcopy(initialState))
+	model.setControlGains(gains)
+	reference = copy.deepcopy(referenceInput)
+
+	recorded = {name: numpy.empty(numSteps + 1) for name in recordedNames}
+	chi, Va, altitude = recorded['chi'], recorded['Va'], recorded['altitude']
+	cPitch, aPitch, cRoll, aRoll = recorded['cPitch'], recorded['aPitch'], recorded['cRoll'], recorded['aRoll']
+	Throttle, Aileron, Elevator, Rudder = recorded['Throttle'], recorded['Aileron'], recorded['Elevator'], recorded['Rudder']
+
+	commandedCourse = math.degrees(reference.commandedCourse)
+	if abortCost is not None:
+		abortSum = abortCost * (numSteps + 1)
+	runningSum = 0.0
+	aborted = False
+
+	for i in range(numSteps + 1):
+		model.Update(reference)
+		curState = model.getVehicleState()
+		chi[i] = curState.chi
+		Va[i] = curState.Va
+		altitude[i] = -curState.pd
+		cPitch[i] = reference.commandedPitch
+		aPitch[i] = curState.pitch
+		cRoll[i] = reference.commandedRoll
+		aRoll[i] = curState.roll
+		actualControl = model.getVehicleControlSurfaces()
+		Throttle[i] = actualControl.Throttle
+		Aileron[i] = actualControl.Aileron
+		Elevator[i] = actualControl.Elevator
+		Rudder[i] = actualControl.Rudder
+		if abortCost is not None:
+			runningSum += _stepCost(_wrapDegrees(math.degrees(curState.chi) - commandedCourse),
+									curState.Va - reference.commandedAirspeed, -curState.pd - reference.commandedAltitude)
+			if not runningSum <= abortSum:  # also catches a state that is no longer finite
+				aborted = True
+				break
+
+	if aborted:
+		for name in recordedNames:
+			recorded[name] = recorded[name][:i + 1]
+	for name in ['chi', 'cPitch', 'aPitch', 'cRoll', 'aRoll', 'Aileron', 'Elevator', 'Rudder']:
+		numpy.degrees(recorded[name], out=recorded[name])
+	recorded['time'] = VPC.dT * numpy.arange(len(recorded['chi']))
+	recorded['numSteps'] = numSteps
+	recorded['aborted'] = aborted
+	recorded['commandedCourse'] = commandedCourse
+	recorded['commandedAirspeed'] = reference.commandedAirspeed
+	recorded['commandedAltitude'] = reference.commandedAltitude
+	return recorded
+
+def trackingMetrics(recorded):
+	"""
+	Root mean square tracking error of each loop of a gains test, in the order of metricNames.
+
+	:param recorded: dictionary returned by runGainsTest
+	:return: numpy array of the metrics
+	"""
+	courseError = _wrapDegrees(recorded['chi'] - recorded['commandedCourse'])
+	errors = numpy.stack((courseError,
+						  recorded['Va'] - recorded['commandedAirspeed'],
+						  recorded['altitude'] - recorded['commandedAltitude'],
+						  recorded['aPitch'] - recorded['cPitch'],
+						  recorded['aRoll'] - recorded['cRoll']))
+	return numpy.sqrt(numpy.mean(errors ** 2, axis=1))
+
+def trackingCost(recorded):
+	"""
+	Single number cost of a gains test: the mean over the run of the squared outer loop (course, airspeed and altitude)
+	tracking errors, each normalized by its cost scale. Aborted runs have infinite cost.
+
+	:param recorded: dictionary returned by runGainsTest
+	:return: cost (float)
+	"""
+	if recorded.get('aborted', False):
+		return math.inf
+	costs = _stepCost(_wrapDegrees(recorded['chi'] - recorded['commandedCourse']),
+					  recorded['Va'] - recorded['commandedAirspeed'], recorded['altitude'] - recorded['commandedAltitude'])
+	cost = float(numpy.sum(costs) / (recorded['numSteps'] + 1))
+	return cost if math.isfinite(cost) else math.inf
+
+def _runGainsTestWorker(arguments):
+	"""
+	Module level entry point for worker processes (must be picklable), returns the recording and its metrics.
+	"""
+	recorded = runGainsTest(*arguments)
+	return recorded, trackingMetrics(recorded)
+
+def sharedProcessPool(processes=None):
+	"""
+	Worker pool shared by every evaluation in this process, created on first use and kept for the life of the process
+	instead of starting new workers for every batch of tests. Workers are started with the spawn method so they never
+	inherit the state of a threaded (or GUI) parent; a spawned worker re-imports the main script, so scripts using the
+	pool need the usual if __name__ == "__main__" guard. The GUI runs its tests in its own worker thread instead.
+
+	:param processes: number of worker processes, defaults to the number of processors. Asking for a different number
+		replaces the pool.
+	:return: concurrent.futures.ProcessPoolExecutor
+	"""
+	global _sharedPool, _sharedPoolProcesses
+	if _sharedPool is None or processes != _sharedPoolProcesses:
+		if _sharedPool is not None:
+			_sharedPool.shutdown()
+		_sharedPool = concurrent.futures.ProcessPoolExecutor(max_workers=processes,
+															 mp_context=multiprocessing.get_context('spawn'))
+		_sharedPoolProcesses = processes
+	return _sharedPool
+
+def evaluateGains(candidateGains, referenceInput, trimControls=None, initialState=None, numSteps=testNumSteps,
+				  processes=None, abortCost=None, executor=None):
+	"""
+	Runs a gains test for every candidate in parallel worker processes.
+
+	:param candidateGains: sequence of controlGains
+	:param referenceInput: referenceCommands flown by every candidate
+	:param trimControls: trim controlInputs used by the autopilot
+	:param initialState: vehicleState to start from
+	:param numSteps: number of simulation steps per test
+	:param processes: number of worker processes of the shared pool (see sharedProcessPool), defaults to the number of
+		processors, 0 to run the tests one after the other in the calling thread
+	:param abortCost: optional cost at which each run is abandoned early (see runGainsTest)
+	:param executor: optional existing executor to use, processes is ignored if given
+	:return: list of recordings (see runGainsTest), numpy array [n x len(metricNames)] of tracking metrics
+	"""
+	argumentList = [(gains, referenceInput, trimControls, initialState, numSteps, abortCost) for gains in candidateGains]
+	if executor is None and processes == 0:
+		outcomes = [_runGainsTestWorker(arguments) for arguments in argumentList]
+	else:
+		if executor is None:
+			executor = sharedProcessPool(processes)
+		outcomes = list(executor.map(_runGainsTestWorker, argumentList))
+	recordings = [recorded for recorded, metrics in outcomes]
+	metrics = numpy.array([metrics for recorded, metrics in outcomes]).reshape(len(outcomes), len(metricNames))
+	return recordings, metrics
+
+def submitGainsTest(executor, gains, referenceInput, trimControls=None, initialState=None, numSteps=testNumSteps):
+	"""
+	Queues a single gains test on an existing executor (e.g. a ProcessPoolExecutor) without waiting for it.
+
+	:return: concurrent.futures.Future resolving to (recording, metrics)
+	"""
+	return executor.submit(_runGainsTestWorker, (gains, referenceInput, trimControls, initialState, numSteps, None))
@@ -0,0 +1,176 @@
+"""
+Step response metrics for closed loop runs. Computes the rise time, overshoot, settling time and steady state error of the
+course, altitude, airspeed, pitch and roll loops, and the control effort of each control surface, directly from the arrays
+recorded by GainsTest.runGainsTest. Everything is computed with array operations over the last (time) axis, so a whole
+batch of runs stacked into [n x numSamples] arrays is handled in a single pass the same way as one run.
+"""
+
+import math
+
+import numpy
+
+loopNames = ['course', 'altitude', 'airspeed', 'pitch', 'roll']
+stepMetricNames = ['riseTime', 'overshoot', 'settlingTime', 'steadyStateError']
+controlNames = ['Throttle', 'Aileron', 'Elevator', 'Rudder']
+
+riseLimits = (0.1, 0.9)		# fractions of the step between which the rise time is measured
+settlingBand = 0.02			# fraction of the step the response must stay within to be settled
+minimumStep = 1e-6			# steps smaller than this have no meaningful rise time, overshoot or settling time
+
+# recorded names of the response and command of each loop, in the order of loopNames
+loopRecordedNames = {'course': ('chi', 'commandedCourse'), 'altitude': ('altitude', 'commandedAltitude'),
+					 'airspeed': ('Va', 'commandedAirspeed'), 'pitch': ('aPitch', 'cPitch'), 'roll': ('aRoll', 'cRoll')}
+
+def _firstTrue(condition, time):
+	"""
+	Time at which condition (along the last axis) first holds, nan where it never does.
+	"""
+	index = numpy.argmax(condition, axis=-1)
+	found = numpy.take_along_axis(condition, index[..., numpy.newaxis], axis=-1)[..., 0]
+	return numpy.where(found, time[index], numpy.nan)
+
+def stepResponseMetrics(time, response, command, wrapAngles=False):
+	"""
+	Step response metrics of one loop. The step is taken from the first sample of the response to the final command, so
+	loops whose command moves during the run (such as the inner pitch and roll loops) are measured against where the
+	command ends up.
+
+	Overshoot is in percent of the step, the rise time is the time taken from riseLimits[0] to riseLimits[1] of the step
+	and the settling time is the time after which the response stays within settlingBand of the step around the command
+	(nan if it never settles within the run). Rise time, overshoot and settling time are nan for steps smaller than
+	minimumStep.
+
+	:param time: array [numSamples] of sample times [s]
+	:param response: array [... x numSamples] of the measured response
+	:param command: array [... x numSamples] of the command, or scalar / array [...] for a constant command
+	:param wrapAngles: True for angles in degrees that should be compared modulo 360 (course)
+	:return: array [... x len(stepMetricNames)]
+	"""
+	time = numpy.asarray(time, dtype=float)
+	response = numpy.asarray(response, dtype=float)
+	command = numpy.asarray(command, dtype=float)
+	if command.ndim == response.ndim:
+		finalCommand = command[..., -1]
+	else:
+		finalCommand = numpy.broadcast_to(command, response.shape[:-1])
+
+	if wrapAngles:
+		# unwrap relative to the command so that the response is continuous and the step takes the short way around
+		response = numpy.degrees(numpy.unwrap(numpy.radians(response), axis=-1))
+		offset = (finalCommand - response[..., 0] + 180.0) % 360.0 - 180.0
+		finalCommand = response[..., 0] + offset
+
+	initial = response[..., 0]
+	step = finalCommand - initial
+	validStep = numpy.abs(step) >= minimumStep
+	safeStep = numpy.where(validStep, step, 1.0)
+	progress = (response - initial[..., numpy.newaxis]) / safeStep[..., numpy.newaxis]  # 0 at the start, 1 at the command
+
+	riseTime = _firstTrue(progress >= riseLimits[1], time) - _firstTrue(progress >= riseLimits[0], time)
+	overshoot = 100.0 * numpy.maximum(numpy.max(progress, axis=-1) - 1.0, 0.0)
+
+	outside = numpy.abs(progress - 1.0) > settlingBand
+	lastOutside = outside.shape[-1] - 1 - numpy.argmax(outside[..., ::-1], axis=-1)
+	neverOutside = ~numpy.any(outside, axis=-1)
+	settledIndex = numpy.minimum(lastOutside + 1, len(time) - 1)
+	settlingTime = numpy.where(neverOutside, 0.0, time[settledIndex] - time[0])
+	settlingTime = numpy.where(outside[..., -1], numpy.nan, settlingTime)
+
+	steadyStateError = finalCommand - response[..., -1]
+
+	riseTime, overshoot, settlingTime = [numpy.where(validStep, value, numpy.nan) for value in (riseTime, overshoot, settlingTime)]
+	return numpy.stack((riseTime, overshoot, settlingTime, steadyStateError), axis=-1)
+
+def controlEffort(time, controls):
+	"""
+	Control effort of one control surface: the integral over the run of the squared deflection away from its first
+	(trim) value.
+
+	:param time: array [numSamples] of sample times [s]
+	:param controls: array [... x numSamples] of the control surface
+	:return: array [...]
+	"""
+	controls = numpy.asarray(controls, dtype=float)
+	squared = (controls - controls[..., :1]) ** 2
+	return numpy.sum(0.5 * (squared[..., 1:] + squared[..., :-1]) * numpy.diff(numpy.asarray(time, dtype=float)), axis=-1)
+
+def stackRecordings(recordings):
+	"""
+	Stacks a list of recordings from runGainsTest into one recording of [n x numSamples] arrays. Aborted (shortened) runs
+	are padded with nan so that their metrics come out as nan rather than as a partial response.
+
+	:param recordings: list of dictionaries returned by runGainsTest
+	:return: dictionary with the same keys, arrays stacked along a new first axis
+	"""
+	numSamples = max(len(recorded['time']) for recorded in recordings)
+	stacked = dict()
+	for responseName, commandName in loopRecordedNames.values():
+		for recordedName in (responseName, commandName):
+			if recordedName in stacked:
+				continue
+			stacked[recordedName] = _stackArrays([recorded[recordedName] for recorded in recordings], numSamples)
+	for name in controlNames:
+		stacked[name] = _stackArrays([recorded[name] for recorded in recordings], numSamples)
+	longest = max(recordings, key=lambda recorded: len(recorded['time']))
+	stacked['time'] = numpy.asarray(longest['time'], dtype=float)
+	return stacked
+
+def _stackArrays(values, numSamples):
+	"""
+	Stacks scalars (broadcast) and arrays (nan padded to numSamples) into a single [n x numSamples] array.
+	"""
+	stacked = numpy.full((len(values), numSamples), numpy.nan)
+	for index, value in enumerate(values):
+		value = numpy.asarray(value, dtype=float)
+		if value.ndim == 0:
+			stacked[index] = value
+		elif len(value) == numSamples:
+			stacked[index] = value
+	return stacked
+
+def computeResponseMetrics(recorded):
+	"""
+	Computes every loop metric and the control effort for a recording from runGainsTest, a list of them, or a recording
+	that has already been stacked into [n x numSamples] arrays.
+
+	:param recorded: dictionary returned by runGainsTest, or a list of them
+	:return: step metrics array [... x len(loopNames) x len(stepMetricNames)], control effort [... x len(controlNames)]
+	"""
+	if isinstance(recorded, (list, tuple)):
+		recorded = stackRecordings(recorded)
+	time = recorded['time']
+	loopMetrics = list()
+	for name in loopNames:
+		responseName, commandName = loopRecordedNames[name]
+		loopMetrics.append(stepResponseMetrics(time, recorded[responseName], recorded[commandName],
+											   wrapAngles=(name == 'course')))
+	effort = [controlEffort(time, recorded[name]) for name in controlNames]
+	return numpy.stack(loopMetrics, axis=-2), numpy.stack(effort, axis=-1)
+
+def metricsDictionary(stepMetrics, effort):
+	"""
+	Flattens the arrays from computeResponseMetrics into a dictionary keyed by loop and metric name (e.g. courseRiseTime,
+	ElevatorEffort), handy for reports and for saving batch results.
+	"""
+	metrics = dict()
+	for loopIndex, loopName in enumerate(loopNames):
+		for metricIndex, metricName in enumerate(stepMetricNames):
+			metrics[loopName + metricName[0].upper() + metricName[1:]] = stepMetrics[..., loopIndex, metricIndex]
+	for controlIndex, controlName in enumerate(controlNames):
+		metrics[controlName + 'Effort'] = effort[..., controlIndex]
+	return metrics
+
+def formatSummary(stepMetrics, loops=('course', 'altitude', 'airspeed')):
+	"""
+	Short text summary of the rise time, overshoot and settling time of some loops of a single run.
+	"""
+	summary = list()
+	for name in loops:
+		riseTime, overshoot, settlingTime, steadyStateError = stepMetrics[loopNames.index(name)]
+		entries = ['tr {}'.format(_formatValue(riseTime, 's')), 'os {}'.format(_formatValue(overshoot, '%')),
+				   'ts {}'.format(_formatValue(settlingTime, 's'))]
+		summary.append('{} {}'.format(name, ' '.join(entries)))
+	return ', '.join(summary)
+
+def _formatValue(value, unit):
+	return '-' if math.isnan(value) else '{:.3g}{}'.format(value, unit)
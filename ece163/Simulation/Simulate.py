@@ -5,6 +5,9 @@ Useless without subclassing.
 import csv
 import pickle
 
+from . import StepProfiler
+from . import SimulationEvents
+
 class Simulate(object):
 	def __init__(self):
 
@@ -14,6 +17,12 @@ class Simulate(object):
 		self.inputNames = list()
 		self.underlyingModel = None
 		self.takenData = list()
+		self.profiler = None	# StepProfiler while profiling is enabled, see enableProfiling
+		self.randomStreams = None	# RandomStreams of the run, see attachRandomStreams and setRandomSeed
+		self.gainSchedule = None	# optional VehicleGainSchedule for closed loop chapters, see setGainSchedule
+		self.events = list()	# SimulationEvents evaluated after every step of run, see addEvent
+		self.eventLog = list()	# (time, event name) of every event that happened
+		self.stoppedBy = None	# name of the terminal event that stopped the run, None if none did
 		return
 
 	def takeStep(self, **kwargs):
@@ -34,6 +43,27 @@ class Simulate(object):
 		self.time = 0
 		self.takenData.clear()
 		self.underlyingModel.reset()
+		self.resetRandomStreams()
+		self.resetEvents()
+		return
+
+	def getControlSurfaces(self):
+		"""
+		Control surfaces the vehicle is flying, for the chapters that fly the closed loop control. Overwritten where the
+		surfaces flown are not the ones stored by the underlying model.
+
+		:return: controlInputs
+		"""
+		return self.underlyingModel.getVehicleControlSurfaces()
+
+	def setGainSchedule(self, gainSchedule=None):
+		"""
+		Sets (or clears with None) the gain schedule used to update the autopilot gains at each step. Only used by the
+		chapters that fly the closed loop control.
+
+		:param gainSchedule: VehicleGainSchedule instance or None
+		"""
+		self.gainSchedule = gainSchedule
 		return
 
 	def exportToPickle(self, filename):
@@ -101,4 +131,177 @@ class Simulate(object):
 			for variableName in variableNames:
 				headers.append(".".join([name, variableName]))
 
-		return headers
\ No newline at end of file
+		return headers
+
+	def profiledPhases(self):
+		"""
+		Methods timed by enableProfiling, as (object, method name, phase name). Found from the underlying model so that
+		every chapter is covered; components that do not exist in a chapter are skipped.
+
+		:return: list of (object, method name, phase name)
+		"""
+		model = self.underlyingModel
+		closedLoop = model if hasattr(model, 'getVehicleAerodynamicsModel') else None
+		aeroModel = closedLoop.getVehicleAerodynamicsModel() if closedLoop is not None else model
+		dynamicsModel = getattr(aeroModel, 'vehicleDynamics', aeroModel)
+		phases = [(self, 'takeStep', 'step'),
+				  (closedLoop, 'UpdateControlCommands', 'control'),
+				  (aeroModel, 'updateForces', 'aeroForces'),
+				  (getattr(aeroModel, 'windModel', None), 'Update', 'wind'),
+				  (dynamicsModel, 'Update', 'dynamics'),
+				  (getattr(self, 'sensorModel', None), 'update', 'sensors'),
+				  (getattr(self, 'estimator', None), 'update', 'estimator'),
+				  (self, 'recordData', 'recording')]
+		return [phase for phase in phases if phase[0] is not None]
+
+	def enableProfiling(self):
+		"""
+		Starts timing the phases of each step (see profiledPhases) into a new StepProfiler.
+
+		:return: the StepProfiler
+		"""
+		self.disableProfiling()
+		self.profiler = StepProfiler.StepProfiler()
+		for target, methodName, phaseName in self.profiledPhases():
+			self.profiler.instrument(target, methodName, phaseName)
+		return self.profiler
+
+	def disableProfiling(self):
+		"""
+		Stops timing and restores the original methods, so that a simulation that is not profiled has no overhead. The
+		profiler (and its timings) stays available in self.profiler until profiling is enabled again.
+		"""
+		if self.profiler is not None:
+			self.profiler.removeAll()
+		return
+
+	def exportProfile(self, filename):
+		"""
+		exports the timings of the profiled phases as JSON, for keeping alongside the exported data
+
+		:param filename: valid file path to write to
+		:return: True if successful, false if not (or if profiling was never enabled)
+		"""
+		if self.profiler is None:
+			return False
+		return self.profiler.export(filename)
+
+	def randomComponents(self):
+		"""
+		Stochastic components of the simulation that are given their own random stream by attachRandomStreams, as
+		(stream name, object). Found from the underlying model like profiledPhases; missing components are skipped.
+
+		:return: list of (stream name, object)
+		"""
+		model = self.underlyingModel
+		aeroModel = model.getVehicleAerodynamicsModel() if hasattr(model, 'getVehicleAerodynamicsModel') else model
+		components = [('wind', getattr(aeroModel, 'windModel', None)),
+					  ('sensors', getattr(self, 'sensorModel', None))]
+		return [component for component in components if component[1] is not None]
+
+	def setRandomSeed(self, seed=None):
+		"""
+		Seeds the run: every stochastic component (see randomComponents) gets its own RandomStream, set as its rng
+		attribute, derived from seed and the component name. This replaces the freshly seeded streams attached when the
+		simulation was made. The streams restart from the seed on reset.
+
+		Setting the streams does not change how a component draws its noise: only a component that draws from self.rng
+		(which offers gauss, random and uniform like the random module) instead of the random module is repeatable from
+		the seed. The provided WindModel and SensorsModel are student code and do whatever their author wrote.
+
+		:param seed: integer seed, a fresh one if None (readable afterwards from self.randomStreams.seed)
+		:return: the RandomStreams
+		"""
+		from ..Utilities import RandomStreams  # imported here so that importing a simulation does not load NumPy
+		self.randomStreams = RandomStreams.RandomStreams(seed)
+		self.attachRandomStreams()
+		return self.randomStreams
+
+	def attachRandomStreams(self):
+		"""
+		Sets the rng attribute of every stochastic component (see randomComponents) to its stream, making freshly seeded
+		streams first if the run has none. Chapters with stochastic components call this at the end of their constructor,
+		so that every component always has an rng to draw from; reset calls it again so that a component replaced since
+		(a new wind model, for instance) gets its stream as well.
+		"""
+		if self.randomStreams is None:
+			from ..Utilities import RandomStreams  # imported here so that importing a simulation does not load NumPy
+			self.randomStreams = RandomStreams.RandomStreams()
+		for name, component in self.randomComponents():
+			component.rng = self.randomStreams.stream(name)
+		return
+
+	def resetRandomStreams(self):
+		"""
+		Restarts the random streams from their seed and attaches them again, if the run has any.
+		"""
+		if self.randomStreams is not None:
+			self.randomStreams.reset()
+			self.attachRandomStreams()
+		return
+
+	def addEvent(self, event):
+		"""
+		Adds an event to detect while running, see SimulationEvents for the event types.
+
+		:param event: SimulationEvent
+		:return: the event
+		"""
+		event.reset()
+		self.events.append(event)
+		return event
+
+	def clearEvents(self):
+		"""
+		Removes every event.
+		"""
+		self.events.clear()
+		self.resetEvents()
+		return
+
+	def resetEvents(self):
+		"""
+		Clears the event log and restarts the detection of every event.
+		"""
+		for event in self.events:
+			event.reset()
+		self.eventLog.clear()
+		self.stoppedBy = None
+		return
+
+	def evaluateEvents(self):
+		"""
+		Evaluates every event at the current time and logs the ones that happened since the last evaluation.
+
+		:return: list of (time, event) that happened, in time order
+		"""
+		happened = list()
+		for event in self.events:
+			eventTime = event.check(self)
+			if eventTime is not None:
+				happened.append((eventTime, event))
+		happened.sort(key=lambda entry: entry[0])
+		for eventTime, event in happened:
+			self.eventLog.append((eventTime, event.name))
+			if event.terminal and self.stoppedBy is None:
+				self.stoppedBy = event.name
+		return happened
+
+	def run(self, numSteps, **kwargs):
+		"""
+		Takes up to numSteps steps, evaluating the events after each one and stopping early at the first terminal event.
+
+		:param numSteps: maximum number of steps
+		:param kwargs: passed to takeStep
+		:return: name of the terminal event that stopped the run, None if it ran every step
+		"""
+		self.stoppedBy = None
+		if self.events:
+			self.evaluateEvents()	# starting values
+		for step in range(numSteps):
+			self.takeStep(**kwargs)
+			if self.events:
+				self.evaluateEvents()
+				if self.stoppedBy is not None:
+					break
+		return self.stoppedBy
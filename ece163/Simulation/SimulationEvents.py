@@ -0,0 +1,112 @@
+"""
+Events detected while a simulation runs, so that runs can record markers or stop as soon as something happens (the vehicle
+gets too low, stalls, saturates its controls, captures its course) without keeping and post-processing the full log.
+
+An event is a scalar function of the simulation that crosses zero when the event happens. It is evaluated after every
+step, and a sign change between two steps is located in time by linear interpolation between them. A terminal event asks
+the simulation to stop; Simulate.run then ends the run early, which saves most of the cost of Monte Carlo runs that have
+already failed.
+"""
+
+import math
+
+from ..Constants import VehiclePhysicalConstants as VPC
+
+class SimulationEvent():
+	def __init__(self, name, function, direction=0, terminal=False):
+		"""
+		Event happening when function crosses zero.
+
+		:param name: name the event is logged under
+		:param function: function of the Simulate instance returning a float
+		:param direction: 1 to only detect rising crossings (negative to non-negative), -1 for falling ones, 0 for both
+		:param terminal: True if the simulation should stop when the event happens
+		"""
+		self.name = name
+		self.function = function
+		self.direction = direction
+		self.terminal = terminal
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Forgets the previous evaluation, the next one only sets the starting value.
+		"""
+		self.lastTime = None
+		self.lastValue = None
+		return
+
+	def check(self, simulate):
+		"""
+		Evaluates the event function at the current time of the simulation.
+
+		:param simulate: Simulate instance
+		:return: interpolated time of the zero crossing since the last evaluation, None if there was none
+		"""
+		time = simulate.time
+		value = self.function(simulate)
+		lastTime, lastValue = self.lastTime, self.lastValue
+		self.lastTime, self.lastValue = time, value
+		if lastTime is None or time <= lastTime:	# first evaluation, or the simulation was reset in between
+			return None
+		rising = lastValue < 0.0 <= value
+		falling = lastValue >= 0.0 > value
+		if (rising and self.direction >= 0) or (falling and self.direction <= 0):
+			return lastTime + (time - lastTime) * lastValue / (lastValue - value)
+		return None
+
+def altitudeBelow(altitude, terminal=True):
+	"""
+	Event when the vehicle descends below an altitude.
+
+	:param altitude: altitude [m]
+	:param terminal: stop the simulation when it happens
+	:return: SimulationEvent
+	"""
+	return SimulationEvent('altitudeBelow', lambda simulate: -simulate.underlyingModel.getVehicleState().pd - altitude,
+						   direction=-1, terminal=terminal)
+
+def stall(alpha0=VPC.alpha0, terminal=False):
+	"""
+	Event when the angle of attack goes beyond the stall angle (either sign).
+
+	:param alpha0: stall angle of attack [rad]
+	:param terminal: stop the simulation when it happens
+	:return: SimulationEvent
+	"""
+	return SimulationEvent('stall', lambda simulate: abs(simulate.underlyingModel.getVehicleState().alpha) - alpha0,
+						   direction=1, terminal=terminal)
+
+def controlSaturation(minControls=VPC.minControls, maxControls=VPC.maxControls, terminal=False):
+	"""
+	Event when any control surface (or the throttle) commanded by the autopilot reaches its limit. Reads the surfaces
+	being flown from the simulation's getControlSurfaces, so needs a closed loop control underlying model.
+
+	:param minControls: controlInputs of the lower limits
+	:param maxControls: controlInputs of the upper limits
+	:param terminal: stop the simulation when it happens
+	:return: SimulationEvent
+	"""
+	names = ['Throttle', 'Aileron', 'Elevator', 'Rudder']
+	limits = [(getattr(minControls, name), getattr(maxControls, name)) for name in names]
+	def saturation(simulate):
+		controls = simulate.getControlSurfaces()
+		values = [getattr(controls, name) for name in names]
+		# negative of the smallest margin to a limit, reaches zero when a control is at its limit
+		return -min(min(value - lower, upper - value) for value, (lower, upper) in zip(values, limits))
+	return SimulationEvent('controlSaturation', saturation, direction=1, terminal=terminal)
+
+def courseCaptured(course=None, tolerance=math.radians(2.0), terminal=False):
+	"""
+	Event when the course comes within tolerance of the commanded course.
+
+	:param course: course to capture [rad], the commanded course of the simulation's referenceInput if None
+	:param tolerance: capture tolerance [rad]
+	:param terminal: stop the simulation when it happens
+	:return: SimulationEvent
+	"""
+	def captured(simulate):
+		target = simulate.referenceInput.commandedCourse if course is None else course
+		return tolerance - abs(math.remainder(simulate.underlyingModel.getVehicleState().chi - target, 2.0 * math.pi))
+	return SimulationEvent('courseCaptured', captured, direction=1, terminal=terminal)
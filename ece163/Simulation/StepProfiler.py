@@ -0,0 +1,158 @@
+"""
+Opt-in timing of the phases inside a simulation step. A StepProfiler replaces chosen methods of the simulation components
+(control law, aerodynamic forces, wind, dynamics integration, sensors, recording) with timed wrappers that store their
+call durations from time.perf_counter_ns in power of two histograms. The wrappers are set as instance attributes, which
+shadow the class methods, and removing them restores the original methods exactly; a simulation that is not being
+profiled therefore runs the unmodified code with no overhead at all.
+
+Histograms use one bucket per power of two nanoseconds, so recording a call is a bit_length and an increment, and
+percentiles are resolved to within a factor of two (reported as the geometric middle of the bucket, clamped to the
+observed minimum and maximum).
+"""
+
+import json
+import math
+import time
+
+bucketCount = 64	# bucket k holds durations in [2**(k-1), 2**k) ns
+
+class TimingHistogram():
+	def __init__(self):
+		"""
+		Power of two histogram of durations in nanoseconds.
+		"""
+		self.buckets = [0] * bucketCount
+		self.count = 0
+		self.totalNs = 0
+		self.minNs = None
+		self.maxNs = 0
+		return
+
+	def add(self, durationNs):
+		"""
+		Adds one duration [ns] to the histogram.
+		"""
+		self.buckets[durationNs.bit_length()] += 1
+		self.count += 1
+		self.totalNs += durationNs
+		if self.minNs is None or durationNs < self.minNs:
+			self.minNs = durationNs
+		if durationNs > self.maxNs:
+			self.maxNs = durationNs
+		return
+
+	def percentile(self, fraction):
+		"""
+		Approximate duration [ns] below which the given fraction of the calls fall.
+
+		:param fraction: 0 to 1 (e.g. 0.99 for the 99th percentile)
+		:return: duration [ns], None if the histogram is empty
+		"""
+		if self.count == 0:
+			return None
+		rank = fraction * self.count
+		cumulative = 0
+		for index, inBucket in enumerate(self.buckets):
+			cumulative += inBucket
+			if inBucket and cumulative >= rank:
+				estimate = 0.0 if index == 0 else math.sqrt(2 ** (index - 1) * 2 ** index)
+				return min(max(estimate, self.minNs), self.maxNs)
+		return self.maxNs
+
+	def summary(self):
+		"""
+		Dictionary with the count, total, mean, minimum, maximum and 50th/90th/99th percentiles, times in microseconds.
+		"""
+		if self.count == 0:
+			return {'count': 0}
+		return {'count': self.count, 'totalUs': self.totalNs * 1e-3, 'meanUs': self.totalNs * 1e-3 / self.count,
+				'minUs': self.minNs * 1e-3, 'maxUs': self.maxNs * 1e-3, 'p50Us': self.percentile(0.5) * 1e-3,
+				'p90Us': self.percentile(0.9) * 1e-3, 'p99Us': self.percentile(0.99) * 1e-3}
+
+def _timedMethod(method, histogram):
+	"""
+	Wraps a bound method so every call is timed into histogram.
+	"""
+	counter = time.perf_counter_ns
+	add = histogram.add
+	def timedMethod(*args, **kwargs):
+		start = counter()
+		try:
+			return method(*args, **kwargs)
+		finally:
+			add(counter() - start)
+	timedMethod.__wrapped__ = method
+	return timedMethod
+
+class StepProfiler():
+	def __init__(self):
+		"""
+		Collection of timed phases, see instrument to add them.
+		"""
+		self.histograms = dict()
+		self.instrumented = list()  # (object, method name) pairs that have a timed wrapper installed
+		return
+
+	def instrument(self, target, methodName, phaseName):
+		"""
+		Times every call of target.methodName into the histogram of phaseName. Several methods may share a phase.
+
+		:param target: object whose method is timed
+		:param methodName: name of the method
+		:param phaseName: name the timings are reported under
+		:return: True if the method exists and was instrumented
+		"""
+		if target is None or not callable(getattr(target, methodName, None)):
+			return False
+		if methodName in vars(target):  # already wrapped (or otherwise overridden on the instance), leave it be
+			return False
+		histogram = self.histograms.setdefault(phaseName, TimingHistogram())
+		setattr(target, methodName, _timedMethod(getattr(target, methodName), histogram))
+		self.instrumented.append((target, methodName))
+		return True
+
+	def removeAll(self):
+		"""
+		Removes every timed wrapper, restoring the original methods. The histograms are kept.
+		"""
+		for target, methodName in self.instrumented:
+			try:
+				delattr(target, methodName)
+			except AttributeError:
+				pass
+		self.instrumented.clear()
+		return
+
+	def reset(self):
+		"""
+		Clears the timings without removing the wrappers.
+		"""
+		for histogram in self.histograms.values():
+			histogram.__init__()
+		return
+
+	def summary(self):
+		"""
+		Summary of every phase, see TimingHistogram.summary.
+
+		:return: dictionary of phase name to summary dictionary
+		"""
+		return {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+	def export(self, filename):
+		"""
+		Writes the summaries and the raw histograms of every phase to a JSON file.
+
+		:param filename: valid file path to write to
+		:return: True if successful, false if not
+		"""
+		profile = {'bucketUnit': 'ns, bucket k holds [2**(k-1), 2**k)',
+				   'phases': {name: dict(histogram.summary(), buckets=histogram.buckets)
+							  for name, histogram in self.histograms.items()}}
+		try:
+			with open(filename, 'w') as f:
+				json.dump(profile, f, indent=1)
+		except OSError as e:
+			print(e)
+			return False
+		return True
@@ -0,0 +1,30 @@
+"""
+NumPy versions of the rotations needed by the array code paths (vehicle drawing, batch sensors), working on arrays of
+angles at once. Kept apart from Rotations so that the scalar code does not need NumPy.
+"""
+
+import numpy
+
+def euler2DCM(yaw, pitch, roll):
+	"""
+	Direction cosine matrices (inertial to body) for arrays of Euler angles, same convention as Rotations.euler2DCM.
+
+	:param yaw: array of yaw angles [rad]
+	:param pitch: array of pitch angles [rad], same shape as yaw
+	:param roll: array of roll angles [rad], same shape as yaw
+	:return: numpy array [... x 3 x 3]
+	"""
+	cPsi, sPsi = numpy.cos(yaw), numpy.sin(yaw)
+	cTheta, sTheta = numpy.cos(pitch), numpy.sin(pitch)
+	cPhi, sPhi = numpy.cos(roll), numpy.sin(roll)
+	R = numpy.empty(numpy.shape(yaw) + (3, 3))
+	R[..., 0, 0] = cTheta * cPsi
+	R[..., 0, 1] = cTheta * sPsi
+	R[..., 0, 2] = -sTheta
+	R[..., 1, 0] = sPhi * sTheta * cPsi - cPhi * sPsi
+	R[..., 1, 1] = sPhi * sTheta * sPsi + cPhi * cPsi
+	R[..., 1, 2] = sPhi * cTheta
+	R[..., 2, 0] = cPhi * sTheta * cPsi + sPhi * sPsi
+	R[..., 2, 1] = cPhi * sTheta * sPsi - sPhi * cPsi
+	R[..., 2, 2] = cPhi * cTheta
+	return R
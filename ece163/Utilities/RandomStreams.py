@@ -0,0 +1,126 @@
+"""
+Seeded, independent random number streams for the stochastic parts of the simulation (wind gusts, sensor noise, ...).
+Each component gets its own named stream, derived from a single run seed with a NumPy SeedSequence, so a run can be
+repeated exactly from its seed, components do not disturb each other's sequences when one of them draws more or fewer
+numbers, and parallel runs with different seeds never share hidden state the way the global random module does.
+
+A stream offers the parts of the random.Random interface used by the models (gauss, normalvariate, random, uniform), so
+a component can draw from self.rng where it would have called the random module; only components written that way follow
+the seed. GainsOptimizer, SensorLogGenerator and BatchSensorsModel draw all of their randomness from these streams. Gaussian samples are drawn from
+the NumPy generator in blocks and handed out one at a time, which keeps the per call cost of scalar draws low; the
+underlying generator is also available for vectorized draws.
+"""
+
+import zlib
+
+import numpy
+
+defaultBlockSize = 4096		# Gaussian samples drawn at once by each stream
+
+class RandomStream():
+	def __init__(self, seedSequence, blockSize=defaultBlockSize):
+		"""
+		Random stream from a SeedSequence, see RandomStreams.stream for the usual way to make one.
+
+		:param seedSequence: numpy.random.SeedSequence the stream is generated from
+		:param blockSize: number of Gaussian samples drawn at a time
+		"""
+		self.seedSequence = seedSequence
+		self.blockSize = blockSize
+		self.reset()
+		return
+
+	def reset(self):
+		"""
+		Restarts the stream from its seed, the same numbers are produced again.
+		"""
+		self.generator = numpy.random.Generator(numpy.random.PCG64(self.seedSequence))
+		self.normalBlock = list()
+		self.normalIndex = 0
+		return
+
+	def gauss(self, mu=0.0, sigma=1.0):
+		"""
+		Gaussian sample with mean mu and standard deviation sigma, same use as random.gauss.
+		"""
+		if self.normalIndex >= len(self.normalBlock):
+			self.normalBlock = self.generator.standard_normal(self.blockSize).tolist()
+			self.normalIndex = 0
+		value = self.normalBlock[self.normalIndex]
+		self.normalIndex += 1
+		return mu + sigma * value
+
+	normalvariate = gauss
+
+	def random(self):
+		"""
+		Uniform sample in [0, 1), same use as random.random.
+		"""
+		return float(self.generator.random())
+
+	def uniform(self, a, b):
+		"""
+		Uniform sample between a and b, same use as random.uniform.
+		"""
+		return a + (b - a) * self.random()
+
+	def normalArray(self, shape, mu=0.0, sigma=1.0):
+		"""
+		Array of Gaussian samples, for vectorized noise generation. Drawn directly from the generator, independent of the
+		block used by gauss.
+
+		:param shape: shape of the array
+		:return: numpy array
+		"""
+		return mu + sigma * self.generator.standard_normal(shape)
+
+class RandomStreams():
+	def __init__(self, seed=None, spawnKey=()):
+		"""
+		Set of named random streams derived from one seed. The streams are determined by self.seed together with
+		self.spawnKey, which is empty for a set made from a seed and identifies the child for sets made by spawn, so
+		RandomStreams(streams.seed, streams.spawnKey) makes the same streams again.
+
+		:param seed: integer seed of the run (or a numpy.random.SeedSequence), a fresh random seed if None, readable
+			afterwards from self.seed
+		:param spawnKey: spawn key of a child set (see spawn), ignored if seed is a SeedSequence
+		"""
+		if isinstance(seed, numpy.random.SeedSequence):
+			self.rootSequence = seed
+		else:
+			self.rootSequence = numpy.random.SeedSequence(seed, spawn_key=tuple(spawnKey))
+		self.seed = self.rootSequence.entropy
+		self.spawnKey = self.rootSequence.spawn_key
+		self.streams = dict()
+		return
+
+	def stream(self, name, blockSize=defaultBlockSize):
+		"""
+		Stream for a named component. The stream depends only on the run seed and the name, not on which other streams
+		exist or the order they were asked for in.
+
+		:param name: name of the component (e.g. 'wind', 'sensors')
+		:return: RandomStream
+		"""
+		if name not in self.streams:
+			childSequence = numpy.random.SeedSequence(self.seed, spawn_key=self.rootSequence.spawn_key + (zlib.crc32(name.encode()),))
+			self.streams[name] = RandomStream(childSequence, blockSize)
+		return self.streams[name]
+
+	def spawn(self, count):
+		"""
+		Independent child RandomStreams, one per parallel run (e.g. for Monte Carlo workers). Children share the seed of
+		their parent and differ by their spawnKey.
+
+		:param count: number of children
+		:return: list of RandomStreams
+		"""
+		return [RandomStreams(childSequence) for childSequence in self.rootSequence.spawn(count)]
+
+	def reset(self):
+		"""
+		Restarts every stream from its seed.
+		"""
+		for stream in self.streams.values():
+			stream.reset()
+		return